@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UI/UX Pro Max Benchmark - index memory and query latency for the BM25 engine
+Usage: python benchmark.py [--scale 1] [--repeat 200] [--workers 4] [--threads N]
+
+Sections:
+  memory    Index memory: list-of-tuples postings vs compressed postings
+  latency   Per-query latency over every CSV_CONFIG / STACK_CONFIG file
+  hybrid    Lexical vs hybrid (BM25 + LSA) latency against HYBRID_BUDGET_MS
+  render    Peak allocation per document: joined vs streamed formatters
+  suggest   Prefix completion latency per keystroke (suggest)
+  color     Nearest-palette lookup over colors.csv replicated to thousands of palettes
+  phrase    Quoted phrase / proximity queries vs the same words unquoted, plus position storage
+  fork      Private memory per forked worker: plain vs frozen indexes (Linux)
+  threads   Query throughput by thread count, checked against single-threaded results
+            (scales with cores only on free-threaded CPython, e.g. python3.13t)
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import core
+from core import CSV_CONFIG, STACK_CONFIG, _STACK_COLS, BM25, load_data, search
+
+QUERIES = ["glassmorphism dark", "saas dashboard", "fintech crypto", "animation accessibility",
+           "elegant luxury serif", "hero social proof", "real-time chart", "form validation"]
+HYBRID_BUDGET_MS = 1.0  # A hybrid query on the bundled data must stay under this
+
+
+def _all_documents(scale=1):
+    """Documents for every configured file, optionally replicated to simulate a larger corpus"""
+    configs = [(cfg["file"], cfg["search_cols"]) for cfg in CSV_CONFIG.values()]
+    configs += [(cfg["file"], _STACK_COLS["search_cols"]) for cfg in STACK_CONFIG.values()]
+    corpora = []
+    for filename, search_cols in configs:
+        rows = load_data(filename)
+        if rows:
+            corpora.append([" ".join(str(row.get(col, "")) for col in search_cols) for row in rows] * scale)
+    return corpora
+
+
+def _measure(build):
+    """Return (result, traced bytes) retained by build()"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _tuple_index(documents):
+    """Reference layout: token lists plus postings as Python lists of (doc, tf) tuples"""
+    tokenizer = BM25()
+    corpus = [tokenizer.tokenize(doc) for doc in documents]
+    postings = defaultdict(list)
+    for idx, tokens in enumerate(corpus):
+        counts = defaultdict(int)
+        for word in tokens:
+            counts[word] += 1
+        for word, tf in counts.items():
+            postings[word].append((idx, tf))
+    return corpus, dict(postings)
+
+
+def _compressed_index(documents):
+    bm25 = BM25()
+    bm25.fit(documents)
+    return bm25
+
+
+def bench_memory(scale):
+    corpora = _all_documents(scale)
+    _, naive = _measure(lambda: [_tuple_index(docs) for docs in corpora])
+    _, compressed = _measure(lambda: [_compressed_index(docs) for docs in corpora])
+    docs = sum(len(c) for c in corpora)
+    print(f"## Index memory ({docs} documents, scale x{scale})")
+    print(f"- list-of-tuples postings: {naive / 1024:.1f} KiB")
+    print(f"- compressed postings:     {compressed / 1024:.1f} KiB ({naive / max(compressed, 1):.1f}x smaller)")
+    print("")
+
+
+def bench_latency(repeat):
+    for query in QUERIES:  # Warm the index cache
+        search(query)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            search(query)
+    elapsed = time.perf_counter() - start
+    print("## Query latency (warm index)")
+    print(f"- {elapsed / (repeat * len(QUERIES)) * 1e6:.1f} us/query over {repeat * len(QUERIES)} queries")
+    print("")
+
+
+def bench_hybrid(repeat):
+    print("## Hybrid latency (BM25 + LSA, reciprocal rank fusion)")
+    if core._load_numpy() is None:
+        print("- skipped: NumPy is not installed")
+        print("")
+        return
+    domains = list(CSV_CONFIG)
+    for domain in domains:  # Build lexical and latent indexes up front
+        search(QUERIES[0], domain, hybrid=True)
+    timings = {}
+    for hybrid in (False, True):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in QUERIES:
+                for domain in domains:
+                    search(query, domain, hybrid=hybrid)
+        timings[hybrid] = (time.perf_counter() - start) / (repeat * len(QUERIES) * len(domains)) * 1000
+    status = "OK" if timings[True] < HYBRID_BUDGET_MS else "OVER BUDGET"
+    print(f"- lexical: {timings[False]:.3f} ms/query")
+    print(f"- hybrid:  {timings[True]:.3f} ms/query (budget {HYBRID_BUDGET_MS:.1f} ms: {status})")
+    print("")
+
+
+def bench_suggest(repeat):
+    words = ["playfair", "arrow", "glassmorphism", "inter", "dark mode"]
+    keystrokes = [word[:i] for word in words for i in range(1, len(word) + 1)]
+    core.suggest("a")  # Build the prefix indexes
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for prefix in keystrokes:
+            core.suggest(prefix)
+    elapsed = time.perf_counter() - start
+    print("## Suggest latency (all suggest domains)")
+    print(f"- {elapsed / (repeat * len(keystrokes)) * 1e6:.1f} us/keystroke over {repeat * len(keystrokes)} prefixes")
+    print("")
+
+
+COLOR_QUERIES = [[core._hex_to_oklab("#1E40AF")], [core._hex_to_oklab("#0F172A"), core._hex_to_oklab("#F59E0B")]]
+
+
+def bench_color(repeat, palettes=5000):
+    rows = load_data(CSV_CONFIG["color"]["file"])
+    if not rows:
+        return
+    index = core.ColorIndex(rows * (palettes // len(rows) + 1))
+    print(f"## Nearest palette ({index.N} palettes)")
+    numpy = core._load_numpy()
+    for label, enabled in (("numpy", numpy is not None), ("fallback", True)):
+        if not enabled:
+            print(f"- {label}: skipped (NumPy is not installed)")
+            continue
+        core.np = numpy if label == "numpy" else False
+        index.nearest(COLOR_QUERIES[0], 3)
+        runs = repeat if label == "numpy" else max(1, repeat // 20)
+        start = time.perf_counter()
+        for _ in range(runs):
+            for colors in COLOR_QUERIES:
+                index.nearest(colors, 3)
+        print(f"- {label}: {(time.perf_counter() - start) / (runs * len(COLOR_QUERIES)) * 1000:.3f} ms/query")
+    core.np = numpy if numpy is not None else False
+    print("")
+
+
+PHRASE_QUERIES = ['"dark mode"', '"bento grid"', '"server component"', '"dynamic import"', '"svg icon"',
+                  '"dark oled"~3', '"lazy load" image']
+
+
+def bench_phrase(repeat):
+    indexes = core.load_indexes()
+    positions = sum(index.bm25.positions.itemsize * len(index.bm25.positions) +
+                    index.bm25.position_offsets.itemsize * len(index.bm25.position_offsets)
+                    for index in indexes if index.bm25.positions is not None)
+    print(f"## Phrase queries ({len(indexes)} indexes, positions {positions / 1024:.1f} KiB)")
+    timings = {}
+    for quoted in (False, True):
+        queries = PHRASE_QUERIES if quoted else [query.replace('"', "").split("~")[0] for query in PHRASE_QUERIES]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                for index in indexes:
+                    index.rank(query)
+        timings[quoted] = (time.perf_counter() - start) / (repeat * len(queries) * len(indexes)) * 1e6
+    print(f"- unquoted: {timings[False]:.1f} us/query per index")
+    print(f"- phrase:   {timings[True]:.1f} us/query per index (+{timings[True] / timings[False] * 100 - 100:.0f}%)")
+    print("")
+
+
+def _peak(render):
+    """Peak traced bytes while render() runs"""
+    gc.collect()
+    tracemalloc.start()
+    render()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_render():
+    from design_system import (DesignSystemGenerator, format_ascii_box, format_markdown, format_master_md,
+                               iter_ascii_box, iter_markdown, iter_master_md, write_lines)
+    design_system = DesignSystemGenerator().generate("saas dashboard", "Benchmark")
+    renderers = [("ascii box", format_ascii_box, iter_ascii_box),
+                 ("markdown", format_markdown, iter_markdown),
+                 ("MASTER.md", format_master_md, iter_master_md)]
+    print("## Render allocation per document (peak, written to os.devnull)")
+    with open(os.devnull, 'w', encoding='utf-8') as sink:
+        for name, joined, streamed in renderers:
+            joined(design_system), streamed(design_system)  # Warm caches
+            before = _peak(lambda: sink.write(joined(design_system)))
+            after = _peak(lambda: write_lines(streamed(design_system), sink))
+            print(f"- {name}: joined {before / 1024:.1f} KiB, streamed {after / 1024:.1f} KiB")
+    print("")
+
+
+def _private_kib():
+    """Private (unshared) resident KiB of this process from /proc/self/smaps_rollup"""
+    stats = {}
+    with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                stats[parts[0].rstrip(":")] = int(parts[1])
+    return stats.get("Private_Dirty", 0) + stats.get("Private_Clean", 0)
+
+
+def _worker():
+    """Query every domain and stack, then report private memory"""
+    for query in QUERIES:
+        for domain in CSV_CONFIG:
+            search(query, domain)
+        for stack in STACK_CONFIG:
+            core.search_stack(query, stack)
+        core.search_stacks(query)
+        core.route_domains(query)
+    return _private_kib()
+
+
+def _pre_fork_server(frozen, workers):
+    """Child process: load indexes (optionally frozen), fork workers, return their private KiB"""
+    _worker()  # Build every index before forking
+    if frozen:
+        core.freeze_indexes()
+    pids = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, json.dumps(_worker()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pids.append((pid, read_fd))
+    sizes = []
+    for pid, read_fd in pids:
+        with os.fdopen(read_fd, "rb") as f:
+            sizes.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    return sizes
+
+
+def bench_fork(workers):
+    print(f"## Private memory per forked worker ({workers} workers)")
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"):
+        print("- skipped: needs os.fork and /proc/self/smaps_rollup")
+        print("")
+        return
+    for frozen in (False, True):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # Fresh server per mode so indexes aren't inherited from this process
+            os.close(read_fd)
+            core._INDEX_CACHE.clear()
+            core._ROUTER = None
+            os.write(write_fd, json.dumps(_pre_fork_server(frozen, workers)).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as f:
+            sizes = json.loads(f.read())
+        os.waitpid(pid, 0)
+        label = "frozen" if frozen else "plain "
+        print(f"- {label}: {sum(sizes) / len(sizes):.0f} KiB private/worker (max {max(sizes)} KiB)")
+    print("")
+
+
+def bench_threads(repeat, max_threads):
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    work = [(query, domain) for query in QUERIES for domain in CSV_CONFIG]
+    expected = [search(query, domain) for query, domain in work]  # Also builds every index up front
+    counts = sorted({n for n in (1, 2, 4, 8, 16, 32) if n < max_threads} | {max_threads})
+    print(f"## Thread scaling (GIL {'enabled' if gil else 'disabled'}, {os.cpu_count()} CPUs)")
+
+    def run():
+        for _ in range(repeat):
+            if [search(query, domain) for query, domain in work] != expected:
+                return 1
+        return 0
+
+    baseline = None
+    for threads in counts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            mismatches = sum(executor.map(lambda _: run(), range(threads)))
+        throughput = threads * repeat * len(work) / (time.perf_counter() - start)
+        baseline = baseline or throughput
+        status = f", {mismatches} threads saw different results" if mismatches else ""
+        print(f"- {threads} threads: {throughput:.0f} queries/s ({throughput / baseline:.2f}x){status}")
+    print("")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UI Pro Max Benchmark")
+    parser.add_argument("--scale", type=int, default=1, help="Replicate each corpus N times (default: 1)")
+    parser.add_argument("--repeat", type=int, default=200, help="Latency repetitions per query (default: 200)")
+    parser.add_argument("--workers", type=int, default=4, help="Forked workers in the fork section (default: 4)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1,
+                        help="Most threads in the threads section (default: CPU count)")
+    args = parser.parse_args()
+
+    core._RESULT_CACHE.size = 0  # Measure the engine, not the result cache
+    bench_memory(args.scale)
+    bench_latency(args.repeat)
+    bench_hybrid(max(1, args.repeat // 10))
+    bench_render()
+    bench_suggest(args.repeat)
+    bench_color(args.repeat)
+    bench_phrase(max(1, args.repeat // 10))
+    bench_fork(args.workers)
+    bench_threads(max(1, args.repeat // 20), args.threads)
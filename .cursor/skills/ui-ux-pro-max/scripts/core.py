@@ -2,66 +2,106 @@
 # -*- coding: utf-8 -*-
 """
 UI/UX Pro Max Core - BM25 search engine for UI/UX style guides
+
+Thread safety: search(), search_many(), search_stack(), search_stacks(), suggest(),
+route_domains() and palette_contrast() may be called from many threads at once,
+with or without the GIL. Indexes and their derived structures are built once
+under a per-key lock (_build_once), published with a single store and not
+mutated afterwards, so index lookups take no locks (the result cache holds its
+own lock for each short get/put). Memos filled during queries
+(analyzer words, fuzzy expansions) only ever gain entries any thread would
+compute identically. Configuration (CSV_CONFIG, ANALYZER_CONFIG, set_data_dirs,
+set_query_log, freeze_indexes) is not synchronized: apply it before serving
+queries. reload_data() may run alongside searches; in-flight queries finish on
+the index they started with.
 """
 
+import atexit
 import csv
+import gc
+import hashlib
+import inspect
+import json
+import os
 import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from pathlib import Path
 from math import log
-from collections import defaultdict
+from collections import Counter, OrderedDict, defaultdict, deque
+
+# Hybrid (LSA) retrieval is optional and imports NumPy on first use; lexical search needs only the stdlib
+np = None
 
 # ============ CONFIGURATION ============
 DATA_DIR = Path(__file__).parent.parent / "data"
+# Data layers, lowest priority first: the bundled data plus overlays from UIPRO_DATA_DIRS (os.pathsep-separated)
+DATA_DIRS = [DATA_DIR] + [Path(p) for p in os.environ.get("UIPRO_DATA_DIRS", "").split(os.pathsep) if p]
 MAX_RESULTS = 3
 
 CSV_CONFIG = {
     "style": {
         "file": "styles.csv",
+        "key": ["Style Category"],
         "search_cols": ["Style Category", "Keywords", "Best For", "Type", "AI Prompt Keywords"],
         "output_cols": ["Style Category", "Type", "Keywords", "Primary Colors", "Effects & Animation", "Best For", "Performance", "Accessibility", "Framework Compatibility", "Complexity", "AI Prompt Keywords", "CSS/Technical Keywords", "Implementation Checklist", "Design System Variables"]
     },
     "color": {
         "file": "colors.csv",
+        "key": ["Product Type"],
         "search_cols": ["Product Type", "Notes"],
         "output_cols": ["Product Type", "Primary (Hex)", "Secondary (Hex)", "CTA (Hex)", "Background (Hex)", "Text (Hex)", "Notes"]
     },
     "chart": {
         "file": "charts.csv",
+        "key": ["Data Type"],
         "search_cols": ["Data Type", "Keywords", "Best Chart Type", "Accessibility Notes"],
         "output_cols": ["Data Type", "Keywords", "Best Chart Type", "Secondary Options", "Color Guidance", "Accessibility Notes", "Library Recommendation", "Interactive Level"]
     },
     "landing": {
         "file": "landing.csv",
+        "key": ["Pattern Name"],
         "search_cols": ["Pattern Name", "Keywords", "Conversion Optimization", "Section Order"],
         "output_cols": ["Pattern Name", "Keywords", "Section Order", "Primary CTA Placement", "Color Strategy", "Conversion Optimization"]
     },
     "product": {
         "file": "products.csv",
+        "key": ["Product Type"],
         "search_cols": ["Product Type", "Keywords", "Primary Style Recommendation", "Key Considerations"],
         "output_cols": ["Product Type", "Keywords", "Primary Style Recommendation", "Secondary Styles", "Landing Page Pattern", "Dashboard Style (if applicable)", "Color Palette Focus"]
     },
     "ux": {
         "file": "ux-guidelines.csv",
+        "key": ["Category", "Issue"],
         "search_cols": ["Category", "Issue", "Description", "Platform"],
         "output_cols": ["Category", "Issue", "Platform", "Description", "Do", "Don't", "Code Example Good", "Code Example Bad", "Severity"]
     },
     "typography": {
         "file": "typography.csv",
+        "key": ["Font Pairing Name"],
         "search_cols": ["Font Pairing Name", "Category", "Mood/Style Keywords", "Best For", "Heading Font", "Body Font"],
         "output_cols": ["Font Pairing Name", "Category", "Heading Font", "Body Font", "Mood/Style Keywords", "Best For", "Google Fonts URL", "CSS Import", "Tailwind Config", "Notes"]
     },
     "icons": {
         "file": "icons.csv",
+        "key": ["Icon Name"],
         "search_cols": ["Category", "Icon Name", "Keywords", "Best For"],
         "output_cols": ["Category", "Icon Name", "Keywords", "Library", "Import Code", "Usage", "Best For", "Style"]
     },
     "react": {
         "file": "react-performance.csv",
+        "key": ["Category", "Issue"],
         "search_cols": ["Category", "Issue", "Keywords", "Description"],
         "output_cols": ["Category", "Issue", "Platform", "Description", "Do", "Don't", "Code Example Good", "Code Example Bad", "Severity"]
     },
     "web": {
         "file": "web-interface.csv",
+        "key": ["Category", "Issue"],
         "search_cols": ["Category", "Issue", "Keywords", "Description"],
         "output_cols": ["Category", "Issue", "Platform", "Description", "Do", "Don't", "Code Example Good", "Code Example Bad", "Severity"]
     }
@@ -83,167 +123,1947 @@ STACK_CONFIG = {
     "jetpack-compose": {"file": "stacks/jetpack-compose.csv"}
 }
 
-# Common columns for all stacks
+# Common columns for all stacks ("key" identifies a row across data layers)
 _STACK_COLS = {
+    "key": ["Category", "Guideline"],
     "search_cols": ["Category", "Guideline", "Description", "Do", "Don't"],
     "output_cols": ["Category", "Guideline", "Description", "Do", "Don't", "Code Good", "Code Bad", "Severity", "Docs URL"]
 }
 
 AVAILABLE_STACKS = list(STACK_CONFIG.keys())
 
+# Name columns offered as prefix completions by suggest(), per domain
+SUGGEST_CONFIG = {
+    "icons": ["Icon Name"],
+    "typography": ["Font Pairing Name", "Heading Font", "Body Font"],
+    "style": ["Style Category"]
+}
+SUGGEST_LIMIT = 10
+
+# Categorical columns that get per-value row bitmaps at index time (see search(filters=...))
+FILTER_COLS = ["Severity", "Platform", "Category", "Library", "Type", "Complexity"]
+MAX_LOAD_WORKERS = 8
+
+# Text analysis per index (see Analyzer). "default" applies everywhere; a domain
+# (CSV_CONFIG key, or "stacks" for the stack files) replaces the keys it sets.
+SHORT_TOKENS = ["ui", "ux", "ai", "3d", "2d", "ar", "vr", "ml", "bi", "os", "js", "ev"]
+STOPWORDS = ["the", "and", "for", "with", "that", "this", "from", "into", "your", "are", "was", "its",
+             "has", "have", "not", "but", "can", "all", "any", "use", "via", "per"]
+SYNONYMS = {
+    "ecommerce": ["commerce", "shop"],
+    "grey": ["gray"],
+    "gray": ["grey"],
+    "colour": ["color"],
+    "a11y": ["accessibility"],
+    "fintech": ["finance", "banking"],
+    "cta": ["button"],
+}
+ANALYZER_CONFIG = {
+    "default": {"short_tokens": SHORT_TOKENS, "stopwords": STOPWORDS, "stem": True, "synonyms": SYNONYMS},
+    "typography": {"short_tokens": SHORT_TOKENS + ["jp", "kr", "sc", "tc"]},
+    "icons": {"short_tokens": SHORT_TOKENS + ["x"],  # The "x" (close) icon's name
+              "synonyms": {**SYNONYMS, "close": ["x"], "delete": ["trash"], "trash": ["delete"]}},
+}
+ANALYZER_CACHE_SIZE = 50000  # Memoized words (and query texts) per analyzer before a memo is reset
+
+
+# ============ CONCURRENCY ============
+_BUILD_LOCKS = {}  # (id(cache), key) -> lock held while that entry is built; dropped once published
+
+
+def _build_once(cache, key, build):
+    """cache[key], calling build() at most once per key.
+
+    Lookups of present entries take no lock; concurrent misses on the same key
+    wait on one per-key lock while the first caller builds, then reuse its result.
+    """
+    value = cache.get(key)
+    if value is None:
+        lock_key = (id(cache), key)
+        lock = _BUILD_LOCKS.setdefault(lock_key, threading.Lock())
+        try:
+            with lock:
+                value = cache.get(key)
+                if value is None:
+                    value = build()
+                    cache[key] = value
+        finally:  # Later callers find the published value without a lock
+            if _BUILD_LOCKS.get(lock_key) is lock:
+                _BUILD_LOCKS.pop(lock_key, None)
+    return value
+
+
+# ============ POSTINGS ============
+POSTING_BLOCK_SIZE = 128   # Doc ids per compressed block (one skip pointer per block)
+IMPACT_LEVELS = 65535      # Impact scores are quantized to unsigned 16-bit integers
+FUZZY_MAX_EXPANSIONS = 2   # Nearest vocabulary terms substituted for an unknown query token
+LSA_RANK = 64              # Latent dimensions kept by the truncated SVD
+LSA_CANDIDATES = 20        # Nearest neighbours taken from the latent index per query
+LSA_MIN_SIMILARITY = 0.2   # Cosine floor for latent-only matches
+RRF_K = 60                 # Reciprocal rank fusion constant
+INDEX_POSITIONS = True     # Keep token positions in the search indexes (quoted phrase / proximity queries)
+FIELD_BOOST = 100.0        # Score added to a returned hit matching the first field_boosts value; dominates BM25
+                           # so those hits reorder in priority order (later values get proportionally less)
+BOOST_TERM_WEIGHT = 1.0    # Boost terms score like query terms, scaled by this
+
+
+def _encode_varint(value, out):
+    """Append an unsigned LEB128 varint to a bytearray"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data, start, end, base):
+    """Decode delta-encoded varints in data[start:end] back to absolute doc ids"""
+    docs = []
+    doc = base
+    value = shift = 0
+    for byte in data[start:end]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            doc += value
+            docs.append(doc)
+            value = shift = 0
+    return docs
+
+
+def _trigrams(term):
+    """Character trigrams of a term padded with boundary markers, packed into integers"""
+    codes = [0] + [ord(ch) for ch in term] + [0]
+    return {(codes[i] << 42) | (codes[i + 1] << 21) | codes[i + 2] for i in range(len(codes) - 2)}
+
+
+PHRASE = re.compile(r'"([^"]*)"(?:~(\d+))?')
+
+
+def _parse_phrases(query):
+    """Split quoted phrases out of a query: ("dark mode toggle", [("dark mode", 0)]) for '"dark mode" toggle'.
+
+    "a b"~N is a proximity phrase: at most N other tokens between neighbouring words.
+    The returned query keeps the phrase words, unquoted, so they still score.
+    """
+    phrases = [(match.group(1), int(match.group(2) or 0)) for match in PHRASE.finditer(query)]
+    return PHRASE.sub(lambda match: f" {match.group(1)} ", query), phrases
+
+
+def _in_sequence(positions, slop):
+    """True if one position per list forms an increasing chain with at most slop tokens between neighbours"""
+    for start in positions[0]:
+        prev = start
+        for candidates in positions[1:]:
+            k = bisect_right(candidates, prev)  # Nearest next occurrence leaves the most room for later words
+            if k == len(candidates) or candidates[k] - prev > slop + 1:
+                break
+            prev = candidates[k]
+        else:
+            return True
+    return False
+
+
+def _edit_distance(a, b, bound):
+    """Levenshtein distance between a and b, or bound + 1 once it must exceed bound"""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > bound:
+            return bound + 1
+        previous = current
+    return previous[-1]
+
+
+class Postings:
+    """Read-only view of one term's postings inside a BM25 index.
+
+    Doc ids are delta-encoded varints split into blocks of POSTING_BLOCK_SIZE.
+    Each block has a skip pointer (its last doc id and byte offset) so readers
+    can jump straight to the block that may hold a target doc. Term frequencies
+    and quantized impact scores live in flat typed arrays shared by all terms.
+    """
+
+    __slots__ = ("index", "first_block", "end_block", "first_posting", "df")
+
+    def __init__(self, index, term_id):
+        self.index = index
+        self.first_block = index.term_blocks[term_id]
+        self.end_block = index.term_blocks[term_id + 1]
+        self.first_posting = index.term_postings[term_id]
+        self.df = index.term_postings[term_id + 1] - self.first_posting
+
+    @property
+    def num_blocks(self):
+        return self.end_block - self.first_block
+
+    def block_docs(self, block):
+        """Decode the doc ids of a single block (numbered from 0 within this term)"""
+        index = self.index
+        pos = self.first_block + block
+        base = index.block_last[pos - 1] if block else 0
+        return _decode_varints(index.doc_data, index.block_offsets[pos], index.block_offsets[pos + 1], base)
+
+    def find_block(self, target, start=0):
+        """Skip to the first block (from start) that may contain doc ids >= target"""
+        return bisect_left(self.index.block_last, target, self.first_block + start, self.end_block) - self.first_block
+
+    def doc_ids(self):
+        """Decode all doc ids"""
+        docs = []
+        for block in range(self.num_blocks):
+            docs.extend(self.block_docs(block))
+        return docs
+
+    def tfs(self):
+        return self.index.tfs[self.first_posting:self.first_posting + self.df]
+
+    def impacts(self):
+        return self.index.impacts[self.first_posting:self.first_posting + self.df]
+
+    def __len__(self):
+        return self.df
+
+
+# ============ ANALYZER ============
+_NON_WORD = re.compile(r'[^\w\s]')
+
+
+def _light_stem(word):
+    """Plural stripping (S-stemmer): animations -> animation, galleries -> gallery"""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if word.endswith("s") and not word.endswith(("us", "ss", "is")):
+        return word[:-1]
+    return word
+
+
+class Analyzer:
+    """Text -> index terms: lowercase, split on punctuation, drop stopwords and short words, stem.
+
+    Words shorter than three characters are kept only when allow-listed
+    (short_tokens). Synonyms are expanded on the query side only (query()),
+    so document lengths are unaffected. Each distinct word and query text is
+    analyzed once; repeats cost a dict lookup.
+    """
+
+    def __init__(self, short_tokens=(), stopwords=(), stem=True, synonyms=None):
+        self.short_tokens = frozenset(short_tokens)
+        self.stopwords = frozenset(stopwords)
+        self.stem = stem
+        self._words = {}        # word -> term, or None when dropped
+        self._queries = {}      # query text -> query terms
+        self.synonyms = {}
+        for word, alternatives in (synonyms or {}).items():
+            term = self.term(word)
+            if term is not None:
+                self.synonyms[term] = tuple(t for t in map(self.term, alternatives) if t is not None and t != term)
+
+    def term(self, word):
+        """Index term for one lowercase word (memoized), or None if the word is dropped"""
+        try:
+            return self._words[word]
+        except KeyError:
+            pass
+        if word in self.stopwords or (len(word) <= 2 and word not in self.short_tokens):
+            term = None
+        else:
+            term = _light_stem(word) if self.stem and word not in self.short_tokens else word
+        if len(self._words) >= ANALYZER_CACHE_SIZE:
+            self._words = {}
+        self._words[word] = term
+        return term
+
+    def analyze(self, text):
+        """Index terms of a text, in order"""
+        words = self._words
+        terms = []
+        for word in _NON_WORD.sub(' ', str(text).lower()).split():
+            term = words.get(word, False)
+            if term is False:
+                term = self.term(word)
+            if term is not None:
+                terms.append(term)
+        return terms
+
+    def expand(self, terms):
+        """Terms followed by the synonyms of each (duplicates dropped)"""
+        if not self.synonyms:
+            return terms
+        expanded = list(terms)
+        for term in terms:
+            for alternative in self.synonyms.get(term, ()):
+                if alternative not in expanded:
+                    expanded.append(alternative)
+        return expanded
+
+    def query(self, text):
+        """Query terms: analyze() plus synonym expansion, memoized per query text"""
+        terms = self._queries.get(text)
+        if terms is None:
+            terms = tuple(self.expand(self.analyze(text)))
+            if len(self._queries) >= ANALYZER_CACHE_SIZE:
+                self._queries = {}
+            self._queries[text] = terms
+        return terms
+
+
+_ANALYZERS = {}
+
+
+def get_analyzer(domain=None):
+    """Analyzer for a domain (ANALYZER_CONFIG "default" overlaid with the domain's keys), built once"""
+    return _build_once(_ANALYZERS, domain,
+                       lambda: Analyzer(**{**ANALYZER_CONFIG["default"], **ANALYZER_CONFIG.get(domain, {})}))
+
+
+def _analyzer_domain(filename):
+    """ANALYZER_CONFIG key for a data file: its CSV_CONFIG domain, else stacks"""
+    for domain, config in CSV_CONFIG.items():
+        if config["file"] == filename:
+            return domain
+    return "stacks"
+
+
+# ============ FROZEN STRUCTURES ============
+class FrozenVocabulary:
+    """Read-only term -> id mapping packed into one UTF-8 blob, looked up by binary search.
+
+    Holds no per-term Python objects, so forked workers reading it never touch
+    (and un-share) the parent's pages through reference counts.
+    """
+
+    __slots__ = ("blob", "offsets", "sorted_ids")
+
+    def __init__(self, terms):
+        encoded = [term.encode("utf-8") for term, _ in sorted(terms.items(), key=lambda x: x[1])]
+        self.blob = b"".join(encoded)
+        self.offsets = array('I', [0])
+        for key in encoded:
+            self.offsets.append(self.offsets[-1] + len(key))
+        self.sorted_ids = array('I', sorted(range(len(encoded)), key=encoded.__getitem__))
+
+    def _key(self, term_id):
+        return self.blob[self.offsets[term_id]:self.offsets[term_id + 1]]
+
+    def term(self, term_id):
+        """Term with the given id (decodes just that term)"""
+        return self._key(term_id).decode("utf-8")
+
+    def get(self, term, default=None):
+        key = term.encode("utf-8")
+        ids = self.sorted_ids
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(ids[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(ids) and self._key(ids[lo]) == key:
+            return ids[lo]
+        return default
+
+    def __getitem__(self, term):
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def __iter__(self):
+        """Terms in id order"""
+        for term_id in range(len(self.sorted_ids)):
+            yield self._key(term_id).decode("utf-8")
+
+    def items(self):
+        return ((term, term_id) for term_id, term in enumerate(self))
+
+
+class FrozenRows:
+    """Read-only CSV rows packed into one UTF-8 blob; cells are decoded on access.
+
+    Columns are the union over all rows (overlay layers may add or omit some);
+    a cell whose row lacks the column stays absent rather than becoming "".
+    """
+
+    __slots__ = ("columns", "blob", "offsets", "absent")
+
+    def __init__(self, rows):
+        self.columns = tuple(dict.fromkeys(col for row in rows for col in row if col is not None))
+        parts = []
+        self.offsets = array('I', [0])
+        absent = bytearray((len(rows) * len(self.columns) + 7) // 8)
+        i = 0
+        for row in rows:
+            for col in self.columns:
+                if col not in row:
+                    absent[i >> 3] |= 1 << (i & 7)
+                cell = (row.get(col) or "").encode("utf-8")
+                parts.append(cell)
+                self.offsets.append(self.offsets[-1] + len(cell))
+                i += 1
+        self.blob = b"".join(parts)
+        self.absent = bytes(absent) if any(absent) else None  # one bit per cell; None when every row is complete
+
+    def _cell(self, idx, pos):
+        """Decoded cell, or None if its row lacks the column"""
+        i = idx * len(self.columns) + pos
+        if self.absent is not None and self.absent[i >> 3] >> (i & 7) & 1:
+            return None
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def _row(self, idx, columns):
+        cells = ((col, self._cell(idx, self.columns.index(col))) for col in columns if col in self.columns)
+        return {col: cell for col, cell in cells if cell is not None}
+
+    def project(self, idx, columns):
+        """Decode only the given columns of one row"""
+        return self._row(idx, columns)
+
+    def __getitem__(self, idx):
+        return self._row(idx, self.columns)
+
+    def __len__(self):
+        return (len(self.offsets) - 1) // len(self.columns) if self.columns else 0
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
 
 # ============ BM25 IMPLEMENTATION ============
 class BM25:
-    """BM25 ranking algorithm for text search"""
+    """BM25 ranking algorithm for text search over a compressed inverted index"""
 
-    def __init__(self, k1=1.5, b=0.75):
+    def __init__(self, k1=1.5, b=0.75, analyzer=None, positions=False):
         self.k1 = k1
         self.b = b
-        self.corpus = []
-        self.doc_lengths = []
+        self.analyzer = analyzer or get_analyzer()
+        self.positions = array('H') if positions else None  # token offsets, grouped by posting
+        self.position_offsets = array('I', [0])
+        self.doc_lengths = array('I')
         self.avgdl = 0
-        self.idf = {}
-        self.doc_freqs = defaultdict(int)
+        self.terms = {}             # term -> term id (a FrozenVocabulary once fitted)
+        self.idf = array('d')       # by term id
+        self.term_blocks = array('I', [0])
+        self.term_postings = array('I', [0])
+        self.block_last = array('I')
+        self.block_offsets = array('I', [0])
+        self.doc_data = b""
+        self.tfs = array('H')
+        self.impacts = array('H')
+        self.impact_scale = 1.0
+        self._fuzzy = None          # trigram / length index, built on the first fuzzy lookup (see _fuzzy_index)
+        self._expansions = {}       # unknown token -> nearest vocabulary terms (reset at ANALYZER_CACHE_SIZE)
         self.N = 0
 
     def tokenize(self, text):
-        """Lowercase, split, remove punctuation, filter short words"""
-        text = re.sub(r'[^\w\s]', ' ', str(text).lower())
-        return [w for w in text.split() if len(w) > 2]
+        """Index terms of a text (see Analyzer)"""
+        return self.analyzer.analyze(text)
 
     def fit(self, documents):
-        """Build BM25 index from documents"""
-        self.corpus = [self.tokenize(doc) for doc in documents]
-        self.N = len(self.corpus)
+        """Build BM25 index from documents (plus token positions when built with positions=True)"""
+        term_docs = defaultdict(list)
+        term_positions = defaultdict(list) if self.positions is not None else None
+        for idx, doc in enumerate(documents):
+            tokens = self.tokenize(doc)
+            self.doc_lengths.append(len(tokens))
+            term_freqs = defaultdict(int)
+            for word in tokens:
+                term_freqs[word] += 1
+            for word, tf in term_freqs.items():
+                term_docs[word].append((idx, tf))
+            if term_positions is not None:
+                offsets = defaultdict(list)
+                for position, word in enumerate(tokens):
+                    offsets[word].append(position)
+                for word in term_freqs:
+                    term_positions[word].append(offsets[word])
+        if term_positions is not None and max(self.doc_lengths, default=0) > 0xFFFF:
+            self.positions = array('I')
+
+        self.N = len(self.doc_lengths)
         if self.N == 0:
             return
-        self.doc_lengths = [len(doc) for doc in self.corpus]
         self.avgdl = sum(self.doc_lengths) / self.N
 
-        for doc in self.corpus:
-            seen = set()
-            for word in doc:
-                if word not in seen:
-                    self.doc_freqs[word] += 1
-                    seen.add(word)
+        data = bytearray()
+        exact = []
+        for term_id, (word, postings) in enumerate(term_docs.items()):
+            self.terms[word] = term_id
+            idf = log((self.N - len(postings) + 0.5) / (len(postings) + 0.5) + 1)
+            self.idf.append(idf)
+            prev = 0
+            for i, (doc, tf) in enumerate(postings):
+                if i and i % POSTING_BLOCK_SIZE == 0:
+                    self.block_last.append(prev)
+                    self.block_offsets.append(len(data))
+                _encode_varint(doc - prev, data)
+                prev = doc
+                self.tfs.append(tf)
+                exact.append(self._impact(idf, tf, self.doc_lengths[doc]))
+                if term_positions is not None:
+                    self.positions.extend(term_positions[word][i])
+                    self.position_offsets.append(len(self.positions))
+            self.block_last.append(prev)
+            self.block_offsets.append(len(data))
+            self.term_blocks.append(len(self.block_last))
+            self.term_postings.append(len(self.tfs))
+        self.doc_data = bytes(data)
+        # Per-term str/int objects would outweigh the postings themselves
+        self.terms = FrozenVocabulary(self.terms)
 
-        for word, freq in self.doc_freqs.items():
-            self.idf[word] = log((self.N - freq + 0.5) / (freq + 0.5) + 1)
+        # Quantize impacts against the global maximum so scoring is integer adds
+        max_impact = max(exact, default=0)
+        self.impact_scale = max_impact / IMPACT_LEVELS if max_impact else 1.0
+        self.impacts = array('H', (max(1, round(v / self.impact_scale)) for v in exact))
 
-    def score(self, query):
-        """Score all documents against query"""
-        query_tokens = self.tokenize(query)
-        scores = []
+    def _impact(self, idf, tf, doc_len):
+        """Exact BM25 contribution of a term with frequency tf in a document"""
+        numerator = tf * (self.k1 + 1)
+        denominator = tf + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)
+        return idf * numerator / denominator
+
+    def term(self, term_id):
+        """Vocabulary term with the given id"""
+        return self.terms.term(term_id)
+
+    def _fuzzy_index(self):
+        """(trigram keys, offsets, term ids) and (length offsets, term ids) for expand(), built once"""
+        def build():
+            trigrams = defaultdict(list)
+            lengths = defaultdict(list)
+            for word, term_id in self.terms.items():
+                for gram in _trigrams(word):
+                    trigrams[gram].append(term_id)
+                lengths[len(word)].append(term_id)
+            keys, offsets, terms = array('Q'), array('I', [0]), array('I')
+            for gram in sorted(trigrams):
+                keys.append(gram)
+                terms.extend(trigrams[gram])
+                offsets.append(len(terms))
+            length_offsets, length_terms = array('I', [0]), array('I')
+            for length in range(max(lengths, default=0) + 1):
+                length_terms.extend(lengths.get(length, ()))
+                length_offsets.append(len(length_terms))
+            return (keys, offsets, terms), (length_offsets, length_terms)
+        return _build_once(vars(self), "_fuzzy", build)
+
+    def get_postings(self, term):
+        """Postings view for a term, or None if it is not in the vocabulary"""
+        term_id = self.terms.get(term)
+        return None if term_id is None else Postings(self, term_id)
+
+    def expand(self, token):
+        """Nearest vocabulary terms to an unknown token within the edit-distance bound (cached)"""
+        cached = self._expansions.get(token)
+        if cached is not None:
+            return cached
+
+        bound = 1 if len(token) <= 5 else 2
+        grams = _trigrams(token)
+        # q-gram lemma: each edit destroys at most 3 trigrams
+        min_shared = len(grams) - 3 * bound
+        shared = defaultdict(int)
+        (keys, offsets, gram_terms), (lengths, length_terms) = self._fuzzy_index()
+        if min_shared <= 0:
+            # Too short for the lemma to guarantee a shared trigram: check every term of a nearby length
+            first = lengths[min(max(len(token) - bound, 0), len(lengths) - 1)]
+            last = lengths[min(len(token) + bound + 1, len(lengths) - 1)]
+            for term_id in length_terms[first:last]:
+                shared[term_id] = 0
+        else:
+            for gram in grams:
+                slot = bisect_left(keys, gram)
+                if slot < len(keys) and keys[slot] == gram:
+                    for term_id in gram_terms[offsets[slot]:offsets[slot + 1]]:
+                        shared[term_id] += 1
+
+        matches = []
+        for term_id, count in shared.items():
+            if count >= min_shared:
+                term = self.term(term_id)
+                distance = _edit_distance(token, term, bound)
+                if distance <= bound:
+                    matches.append((distance, -self.idf[term_id], term))
+        matches.sort()
+        expansion = tuple(term for distance, _, term in matches
+                          if distance == matches[0][0])[:FUZZY_MAX_EXPANSIONS]
+        if len(self._expansions) >= ANALYZER_CACHE_SIZE:
+            self._expansions = {}
+        self._expansions[token] = expansion
+        return expansion
+
+    def query_terms(self, query, fuzzy=False):
+        """Tokenize a query and add synonyms; with fuzzy, unknown tokens become their nearest vocabulary terms"""
+        if not fuzzy:
+            return self.analyzer.query(query)
+        tokens = self.tokenize(query)
+        terms = []
+        for token in tokens:
+            if token in self.terms:
+                terms.append(token)
+            else:
+                terms.extend(self.expand(token))
+        return self.analyzer.expand(terms)
+
+    def score(self, query, fuzzy=False, explain=None, mask=None, bonus=None):
+        """Score documents matching the query, best first (integer adds plus a final rescale).
+
+        mask (bytes, one bit per document) restricts scoring to the documents it selects.
+        bonus ({doc: score}) is added to the final scores; its documents are ranked
+        even when no query term matches them.
+        explain, when a dict, is filled during the same pass with the query terms,
+        postings visited, documents scored, elapsed ms and, per document, the
+        posting slots that scored it (expanded by explain_hit).
+        """
+        if explain is not None or mask is not None or bonus:
+            return self._score_checked(query, fuzzy, explain, mask, bonus)
+        accumulator = defaultdict(int)
+        impacts = self.impacts
+        for token in self.query_terms(query, fuzzy):
+            postings = self.get_postings(token)
+            if postings is None:
+                continue
+            i = postings.first_posting
+            for block in range(postings.num_blocks):
+                for doc in postings.block_docs(block):
+                    accumulator[doc] += impacts[i]
+                    i += 1
+
+        scale = self.impact_scale
+        return sorted(((idx, total * scale) for idx, total in accumulator.items()),
+                      key=lambda x: (-x[1], x[0]))
+
+    def _score_checked(self, query, fuzzy, explain, mask, bonus=None):
+        """score() with a document mask, a bonus and/or a record of which postings scored each document"""
+        started = time.perf_counter()
+        accumulator = defaultdict(int)
+        slots = None if explain is None else defaultdict(list)   # doc -> [(term, posting slot)]
+        impacts = self.impacts
+        terms = self.query_terms(query, fuzzy)
+        visited = 0
+        for token in terms:
+            postings = self.get_postings(token)
+            if postings is None:
+                continue
+            visited += postings.df
+            i = postings.first_posting
+            for block in range(postings.num_blocks):
+                for doc in postings.block_docs(block):
+                    if mask is None or mask[doc >> 3] >> (doc & 7) & 1:
+                        accumulator[doc] += impacts[i]
+                        if slots is not None:
+                            slots[doc].append((token, i))
+                    i += 1
+
+        scale = self.impact_scale
+        totals = {idx: total * scale for idx, total in accumulator.items()}
+        for idx, extra in (bonus or {}).items():
+            if mask is None or mask[idx >> 3] >> (idx & 7) & 1:
+                totals[idx] = totals.get(idx, 0.0) + extra
+        ranked = sorted(totals.items(), key=lambda x: (-x[1], x[0]))
+        if explain is not None:
+            explain.update({
+                "terms": list(terms),
+                "postings_visited": visited,
+                "documents_scored": len(accumulator),
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+                "slots": slots
+            })
+        return ranked
+
+    def term_scores(self, terms, weight=1.0, mask=None):
+        """{doc: weighted BM25 score} for a list of terms, using the same quantized impacts as score()"""
+        scores = defaultdict(float)
+        impacts = self.impacts
+        unit = self.impact_scale * weight
+        for token in terms:
+            postings = self.get_postings(token)
+            if postings is None:
+                continue
+            i = postings.first_posting
+            for block in range(postings.num_blocks):
+                for doc in postings.block_docs(block):
+                    if mask is None or mask[doc >> 3] >> (doc & 7) & 1:
+                        scores[doc] += impacts[i] * unit
+                    i += 1
+        return scores
+
+    def _intersect(self, postings):
+        """[(doc, [posting slot per list])] for docs present in every postings list.
+
+        Walks the rarest list and leapfrogs the others with their skip pointers,
+        decoding only the blocks that may hold each candidate.
+        """
+        matches = []
+        cursors = [[0, -1, None] for _ in postings]  # per list: next block, decoded block, its doc ids
+        for doc in min(postings, key=len).doc_ids():
+            slots = []
+            for plist, cursor in zip(postings, cursors):
+                block = plist.find_block(doc, cursor[0])
+                if block >= plist.num_blocks:
+                    return matches
+                if block != cursor[1]:
+                    cursor[1], cursor[2] = block, plist.block_docs(block)
+                cursor[0] = block
+                docs = cursor[2]
+                k = bisect_left(docs, doc)
+                if k == len(docs) or docs[k] != doc:
+                    break
+                slots.append(plist.first_posting + block * POSTING_BLOCK_SIZE + k)
+            else:
+                matches.append((doc, slots))
+        return matches
+
+    def phrase_docs(self, phrase, slop=0):
+        """Doc ids containing the phrase's terms in order, at most slop tokens between neighbours.
+
+        Without positions (positions=False) every doc containing all the terms matches.
+        """
+        terms = self.tokenize(phrase)
+        postings = [self.get_postings(term) for term in terms]
+        if not postings or None in postings:
+            return []
+        matches = self._intersect(postings)
+        if self.positions is None or len(terms) == 1:
+            return [doc for doc, _ in matches]
+        positions, offsets = self.positions, self.position_offsets
+        return [doc for doc, slots in matches
+                if _in_sequence([positions[offsets[i]:offsets[i + 1]] for i in slots], slop)]
+
+    def phrase_mask(self, phrases, mask=None):
+        """Document mask (bytes) of docs matching every (phrase, slop), ANDed with mask"""
+        selected = bytearray((self.N + 7) // 8)
+        for doc in self.phrase_docs(*phrases[0]):
+            selected[doc >> 3] |= 1 << (doc & 7)
+        for phrase, slop in phrases[1:]:
+            other = bytearray(len(selected))
+            for doc in self.phrase_docs(phrase, slop):
+                other[doc >> 3] |= 1 << (doc & 7)
+            selected = bytearray(a & b for a, b in zip(selected, other))
+        if mask is not None:
+            selected = bytearray(a & b for a, b in zip(selected, mask))
+        return bytes(selected)
+
+    def explain_hit(self, doc, slots):
+        """Per-term breakdown of one document's score from the posting slots recorded by score()"""
+        length_norm = 1 - self.b + self.b * self.doc_lengths[doc] / self.avgdl
+        return [{
+            "term": term,
+            "tf": self.tfs[i],
+            "idf": round(self.idf[self.terms[term]], 4),
+            "length_norm": round(length_norm, 4),
+            "contribution": round(self.impacts[i] * self.impact_scale, 4)
+        } for term, i in slots]
+
+
+# ============ LATENT SEMANTIC INDEX ============
+def _load_numpy():
+    """Import NumPy on first use so plain searches don't pay for it; None if unavailable"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            np = False
+        else:
+            np = numpy
+    return np or None
+
+
+class LSAIndex:
+    """Latent semantic index over a fitted BM25 vocabulary (requires NumPy).
+
+    Documents are embedded by a TF-IDF matrix reduced with truncated SVD, so
+    terms that co-occur (e.g. "fintech" and "banking") land close together.
+    Built locally from the indexed data: no network access or model downloads.
+    """
+
+    def __init__(self, bm25, rank=LSA_RANK):
+        matrix = np.zeros((bm25.N, len(bm25.terms)), dtype=np.float32)
+        for term_id in range(len(bm25.terms)):
+            postings = Postings(bm25, term_id)
+            docs = postings.doc_ids()
+            tfs = np.asarray(postings.tfs(), dtype=np.float32)
+            matrix[docs, term_id] = (1 + np.log(tfs)) * bm25.idf[term_id]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1)
+
+        u, s, vt = np.linalg.svd(matrix, full_matrices=False)
+        k = max(1, min(rank, len(s)))
+        self.term_vectors = np.ascontiguousarray(vt[:k].T)   # terms x k
+        docs = u[:, :k] * s[:k]
+        norms = np.linalg.norm(docs, axis=1, keepdims=True)
+        self.doc_vectors = np.ascontiguousarray(docs / np.where(norms > 0, norms, 1))
+        self.bm25 = bm25
+
+    def nearest(self, terms, limit=LSA_CANDIDATES):
+        """Brute-force cosine nearest neighbours for query terms: [(doc, similarity)]"""
+        bm25 = self.bm25
+        ids = [bm25.terms[t] for t in terms if t in bm25.terms]
+        if not ids:
+            return []
+        weights = np.asarray([bm25.idf[i] for i in ids], dtype=np.float32)
+        query = weights @ self.term_vectors[ids]
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        similarities = self.doc_vectors @ (query / norm)
+        limit = min(limit, len(similarities))
+        top = np.argpartition(-similarities, limit - 1)[:limit]
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return [(int(doc), float(similarities[doc])) for doc in top if similarities[doc] >= LSA_MIN_SIMILARITY]
+
+
+def _fuse_rankings(*rankings):
+    """Reciprocal rank fusion of [(doc, score)] rankings, best first"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, 1):
+            fused[doc] += 1 / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda x: (-x[1], x[0]))
+
+
+# ============ COLOR INDEX ============
+HEX_COLOR = re.compile(r'#([0-9a-fA-F]{8}|[0-9a-fA-F]{6}|[0-9a-fA-F]{3,4})\b')  # Alpha (#rgba, #rrggbbaa) is ignored
+_MISSING_COLOR = (1e3, 1e3, 1e3)  # Far from every real color, so it never wins a nearest match
+
+# WCAG 2.x minimum contrast checked for every palette: (foreground, background, ratio)
+CONTRAST_REQUIREMENTS = [
+    ("Text (Hex)", "Background (Hex)", 4.5),     # Body text (AA)
+    ("Primary (Hex)", "Background (Hex)", 3.0),  # Large text and UI components (AA)
+    ("CTA (Hex)", "Background (Hex)", 3.0),      # Buttons against the page (non-text contrast)
+]
+
+
+def _linear_rgb(value):
+    """Linear-light sRGB channels of a #rgb / #rrggbb color (alpha dropped), or None if value isn't one"""
+    match = HEX_COLOR.fullmatch(value.strip())
+    if match is None:
+        return None
+    digits = match.group(1)
+    if len(digits) in (4, 8):
+        digits = digits[:len(digits) * 3 // 4]
+    if len(digits) == 3:
+        digits = "".join(c * 2 for c in digits)
+    return tuple(c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+                 for c in (int(digits[i:i + 2], 16) / 255 for i in (0, 2, 4)))
+
+
+def _luminance(value):
+    """WCAG relative luminance of a hex color (NaN if value isn't one)"""
+    rgb = _linear_rgb(value)
+    return float("nan") if rgb is None else 0.2126 * rgb[0] + 0.7152 * rgb[1] + 0.0722 * rgb[2]
+
+
+def _hex_to_oklab(value):
+    """OKLab (L, a, b) of a #rgb / #rrggbb (or #rgba / #rrggbbaa) color, or None if value isn't one"""
+    rgb = _linear_rgb(value)
+    if rgb is None:
+        return None
+    r, g, b = rgb
+    l = (0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b) ** (1 / 3)
+    m = (0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b) ** (1 / 3)
+    s = (0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b) ** (1 / 3)
+    return (0.2104542553 * l + 0.7936177850 * m - 0.0040720468 * s,
+            1.9779984951 * l - 2.4285922050 * m + 0.4505937099 * s,
+            0.0259040371 * l + 0.7827717662 * m - 0.8086757660 * s)
+
+
+class ColorIndex:
+    """Palette colors (every "(Hex)" column) as OKLab vectors plus a WCAG contrast matrix.
+
+    A palette's distance to the query colors is the sum, over query colors, of
+    the Euclidean OKLab distance to the palette's closest color. Vectorized
+    with NumPy when available, plain loops otherwise.
+
+    contrast holds the ratio of every foreground/background column pair of
+    every row, and passed a bitmask of the CONTRAST_REQUIREMENTS each row
+    meets, so accessibility checks are lookups rather than color math.
+    """
+
+    def __init__(self, rows, key_cols=None):
+        self.columns = [col for col in (rows[0] if rows else {}) if col and col.endswith("(Hex)")]
+        self.vectors = array('d')   # row-major: row, column, (L, a, b)
+        self.contrast = array('d')  # row-major: row, foreground column, background column
+        self.passed = array('B')    # row -> bit i set if CONTRAST_REQUIREMENTS[i] is met
+        self.rows_by_key = {}       # lowercase key values -> row
+        position = {col: i for i, col in enumerate(self.columns)}
+        requirements = [(position.get(fg), position.get(bg), minimum) for fg, bg, minimum in CONTRAST_REQUIREMENTS]
+        for idx, row in enumerate(rows):
+            luminance = []
+            for col in self.columns:
+                self.vectors.extend(_hex_to_oklab(row.get(col) or "") or _MISSING_COLOR)
+                luminance.append(_luminance(row.get(col) or ""))
+            base = len(self.contrast)
+            for fg in luminance:
+                for bg in luminance:
+                    self.contrast.append((max(fg, bg) + 0.05) / (min(fg, bg) + 0.05))
+            width = len(self.columns)
+            self.passed.append(sum(1 << i for i, (fg, bg, minimum) in enumerate(requirements)
+                                   if fg is not None and bg is not None
+                                   and self.contrast[base + fg * width + bg] >= minimum))
+            if key_cols:
+                self.rows_by_key.setdefault(" | ".join((row.get(c) or "").strip().lower() for c in key_cols), idx)
+        self.N = len(rows)
+        self._arrays = None     # (matrix, norms): NumPy copy of vectors and squared norms, see _numpy_arrays
+
+    def contrast_report(self, row):
+        """WCAG check of one row: {"<fg>_on_<bg>": {ratio, minimum, passes}, ..., "passed", "accessible"}"""
+        width = len(self.columns)
+        position = {col: i for i, col in enumerate(self.columns)}
+        report = {}
+        for i, (fg, bg, minimum) in enumerate(CONTRAST_REQUIREMENTS):
+            if fg not in position or bg not in position:
+                continue
+            ratio = self.contrast[row * width * width + position[fg] * width + position[bg]]
+            name = f"{fg.replace(' (Hex)', '')}_on_{bg.replace(' (Hex)', '')}".lower()
+            report[name] = {"ratio": round(ratio, 2) if ratio == ratio else None, "minimum": minimum,
+                            "passes": bool(self.passed[row] >> i & 1)}
+        report["passed"] = bin(self.passed[row]).count("1")
+        report["accessible"] = report["passed"] == len(CONTRAST_REQUIREMENTS)
+        return report
+
+    def _numpy_arrays(self):
+        """Column-major copy (all palettes' first color, then all second colors, ...) and its squared norms"""
+        vectors = np.frombuffer(self.vectors, dtype=np.float64).reshape(self.N, len(self.columns), 3)
+        matrix = np.ascontiguousarray(vectors.transpose(1, 0, 2).reshape(-1, 3))
+        return matrix, np.einsum("ij,ij->i", matrix, matrix)
+
+    def nearest(self, colors, limit, mask=None):
+        """Top (row, distance) for the query OKLab colors, closest first (only rows selected by mask, if given)"""
+        if not colors or not self.N or not self.columns:
+            return []
+        if _load_numpy() is not None:
+            width = len(self.columns)
+            matrix, norms = _build_once(vars(self), "_arrays", self._numpy_arrays)  # Published as one pair
+            query = np.asarray(colors, dtype=np.float64)
+            # |x - q|^2 = |x|^2 - 2 x.q + |q|^2 for every palette color and query color in one product
+            squared = norms - 2 * (query @ matrix.T) + np.einsum("ij,ij->i", query, query)[:, None]
+            closest = squared.reshape(len(colors), width, self.N).min(axis=1)
+            distances = np.sqrt(np.maximum(closest, 0)).sum(axis=0)
+            if mask is not None:
+                selected = np.unpackbits(np.frombuffer(mask, dtype=np.uint8), bitorder="little")[:self.N].astype(bool)
+                distances[~selected] = np.inf
+                limit = min(limit, int(selected.sum()))
+                if limit <= 0:
+                    return []
+            limit = min(limit, self.N)
+            top = np.argpartition(distances, limit - 1)[:limit]
+            return sorted(((int(row), float(distances[row])) for row in top), key=lambda x: (x[1], x[0]))
+
+        width = len(self.columns) * 3
+        vectors = self.vectors
+        ranked = []
+        for row in range(self.N):
+            if mask is not None and not mask[row >> 3] >> (row & 7) & 1:
+                continue
+            base = row * width
+            distance = 0.0
+            for L, a, b in colors:
+                distance += min(((vectors[i] - L) ** 2 + (vectors[i + 1] - a) ** 2 + (vectors[i + 2] - b) ** 2) ** 0.5
+                                for i in range(base, base + width, 3))
+            ranked.append((row, distance))
+        ranked.sort(key=lambda x: (x[1], x[0]))
+        return ranked[:limit]
+
+
+# ============ KEYWORD MATCHING ============
+DOMAIN_KEYWORDS = {
+    "color": ["color", "palette", "hex", "#", "rgb"],
+    "chart": ["chart", "graph", "visualization", "trend", "bar", "pie", "scatter", "heatmap", "funnel"],
+    "landing": ["landing", "page", "cta", "conversion", "hero", "testimonial", "pricing", "section"],
+    "product": ["saas", "ecommerce", "e-commerce", "fintech", "healthcare", "gaming", "portfolio", "crypto", "dashboard"],
+    "style": ["style", "design", "ui", "minimalism", "glassmorphism", "neumorphism", "brutalism", "dark mode", "flat", "aurora", "prompt", "css", "implementation", "variable", "checklist", "tailwind"],
+    "ux": ["ux", "usability", "accessibility", "wcag", "touch", "scroll", "animation", "keyboard", "navigation", "mobile"],
+    "typography": ["font", "typography", "heading", "serif", "sans"],
+    "icons": ["icon", "icons", "lucide", "heroicons", "symbol", "glyph", "pictogram", "svg icon"],
+    "react": ["react", "next.js", "nextjs", "suspense", "memo", "usecallback", "useeffect", "rerender", "bundle", "waterfall", "barrel", "dynamic import", "rsc", "server component"],
+    "web": ["aria", "focus", "outline", "semantic", "virtualize", "autocomplete", "form", "input type", "preconnect"]
+}
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over labelled keyword groups.
+
+    Finds every (substring) keyword hit in a single linear pass over the text,
+    so matching cost does not grow with the number of keywords.
+    """
+
+    def __init__(self, groups):
+        self.groups = list(groups)
+        self.labels = []    # keyword id -> group label
+        self.keywords = []  # keyword id -> keyword
+        goto = [{}]
+        out = [[]]
+        for label, keywords in groups.items():
+            for keyword in keywords:
+                node = 0
+                for ch in keyword:
+                    nxt = goto[node].get(ch)
+                    if nxt is None:
+                        nxt = goto[node][ch] = len(goto)
+                        goto.append({})
+                        out.append([])
+                    node = nxt
+                out[node].append(len(self.keywords))
+                self.labels.append(label)
+                self.keywords.append(keyword)
+
+        # Breadth-first failure links; each node inherits its fallback's outputs
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if node else 0
+                out[nxt].extend(out[fail[nxt]])
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [tuple(o) for o in out]
+
+    def find(self, text):
+        """Return the set of keyword ids occurring anywhere in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set(out[0])
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def counts(self, text):
+        """Number of distinct keywords found per group label"""
+        counts = dict.fromkeys(self.groups, 0)
+        for keyword_id in self.find(text):
+            counts[self.labels[keyword_id]] += 1
+        return counts
+
+
+_DOMAIN_MATCHER = KeywordMatcher(DOMAIN_KEYWORDS)
+
+
+# ============ QUERY LOG ============
+QUERY_LOG_BUFFER = 64  # Log lines held in memory before one append to the log file
 
-        for idx, doc in enumerate(self.corpus):
-            score = 0
-            doc_len = self.doc_lengths[idx]
-            term_freqs = defaultdict(int)
-            for word in doc:
-                term_freqs[word] += 1
 
-            for token in query_tokens:
-                if token in self.idf:
-                    tf = term_freqs[token]
-                    idf = self.idf[token]
-                    numerator = tf * (self.k1 + 1)
-                    denominator = tf + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)
-                    score += idf * numerator / denominator
+class QueryLog:
+    """Buffered NDJSON query log: one JSON object per call, appended in batches"""
 
-            scores.append((idx, score))
+    def __init__(self, path, buffer_size=QUERY_LOG_BUFFER):
+        self.path = Path(path)
+        self.buffer_size = buffer_size
+        self._lines = []
+        self._lock = threading.Lock()
 
-        return sorted(scores, key=lambda x: x[1], reverse=True)
+    def record(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, default=str)  # e.g. Path arguments are logged as strings
+        with self._lock:
+            self._lines.append(line)
+            if len(self._lines) >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._lines:
+            lines, self._lines = self._lines, []  # Dropped if the write fails, so the buffer can't grow unbounded
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+
+
+_QUERY_LOG = None
+_LOG_STATE = threading.local()
+
+
+def set_query_log(path):
+    """Start logging top-level queries to path (NDJSON), or stop with None; returns the previous path"""
+    global _QUERY_LOG
+    previous = _QUERY_LOG
+    if previous is not None:
+        previous.flush()
+    _QUERY_LOG = QueryLog(path) if path else None
+    return previous.path if previous is not None else None
+
+
+def _note_cache(hit):
+    """Record whether the current logged call was served from a warm cache (first note wins)"""
+    if getattr(_LOG_STATE, "cache", False) is None:
+        _LOG_STATE.cache = "hit" if hit else "miss"
+
+
+def log_queries(op):
+    """Decorator: log each outermost call of a query function when a query log is set.
+
+    The entry holds the bound arguments (so the call can be replayed), duration,
+    domain, result count and cache status. Calls made while another logged call
+    is running (e.g. searches inside design-system generation) are not logged.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _QUERY_LOG is None or getattr(_LOG_STATE, "depth", 0):
+                return func(*args, **kwargs)
+            _LOG_STATE.depth, _LOG_STATE.cache = 1, None
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _LOG_STATE.depth = 0
+            try:  # Logging is best effort and must never fail the call it records
+                entry = {
+                    "ts": round(time.time(), 3),
+                    "op": op,
+                    "args": dict(signature.bind(*args, **kwargs).arguments),
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                    "cache": _LOG_STATE.cache
+                }
+                if isinstance(result, dict):
+                    entry.update({k: result[k] for k in ("domain", "stack", "count", "error") if k in result})
+                log = _QUERY_LOG
+                if log is not None:
+                    log.record(entry)
+            except (TypeError, ValueError, OSError) as e:
+                print(f"Query log: entry dropped ({e})", file=sys.stderr)
+            return result
+        return wrapper
+    return decorate
+
+
+@atexit.register
+def _flush_query_log():
+    if _QUERY_LOG is not None:
+        _QUERY_LOG.flush()
+
+
+if os.environ.get("UIPRO_QUERY_LOG"):
+    set_query_log(os.environ["UIPRO_QUERY_LOG"])
+
+
+# ============ RESULT CACHE ============
+RESULT_CACHE_SIZE = 1024  # Search results kept in memory (least recently used evicted); 0 disables
+
+
+class ResultCache:
+    """Thread-safe LRU of search results keyed by function and arguments"""
+
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:  # The recency bump reorders the shared OrderedDict
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_RESULT_CACHE = ResultCache()
+
+
+def _as_values(values):
+    """A filter / boost value or collection of values as a list (scalars such as 5 or None become one value)"""
+    return list(values) if isinstance(values, (list, tuple, set, frozenset)) else [values]
+
+
+def _freeze_arg(value):
+    """Hashable form of a call argument (lists become tuples, sets frozensets, dicts sorted item tuples)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_arg(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze_arg(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze_arg(v)) for k, v in value.items()))
+    return value
+
+
+def _copy_result(value):
+    """Copy of a cached result so callers can't mutate the cached one"""
+    if isinstance(value, dict):
+        return {k: _copy_result(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    return value
+
+
+def cache_results(func):
+    """Decorator: serve repeated calls with identical arguments from _RESULT_CACHE"""
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if bound.arguments.get("explain"):  # Timings and pass statistics must be fresh
+            return func(*args, **kwargs)
+        key = (func.__name__,) + tuple(_freeze_arg(v) for v in bound.arguments.values())
+        cached = _RESULT_CACHE.get(key)
+        _note_cache(cached is not None)
+        if cached is None:
+            cached = func(*args, **kwargs)
+            if "error" in cached:
+                return cached
+            _RESULT_CACHE.put(key, cached)
+        return _copy_result(cached)
+    return wrapper
+
+
+# ============ AUTOCOMPLETE ============
+class PrefixIndex:
+    """Sorted completion keys with precomputed weights, searched by bisect.
+
+    Each name is keyed by its full lowercase form and by every later word, so
+    "mode" completes "Dark Mode (OLED)"; word keys carry half the name's weight.
+    """
+
+    def __init__(self, names):
+        """names: {name: (weight, fields)}"""
+        self.names = list(names)
+        self.fields = [tuple(names[name][1]) for name in self.names]
+        self.weights = array('d', (names[name][0] for name in self.names))
+        entries = []
+        for name_id, name in enumerate(self.names):
+            lowered = name.lower()
+            entries.append((lowered, name_id, self.weights[name_id]))
+            for match in re.finditer(r'(?<=[\s(/&+-])\w', lowered):
+                entries.append((lowered[match.start():], name_id, self.weights[name_id] / 2))
+        entries.sort()
+        self.keys = [key for key, _, _ in entries]
+        self.entry_names = array('I', (name_id for _, name_id, _ in entries))
+        self.entry_weights = array('d', (weight for _, _, weight in entries))
+
+    def complete(self, prefix, k=SUGGEST_LIMIT):
+        """Top-k (weight, name id) whose keys start with prefix, heaviest first"""
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        best = {}
+        for i in range(lo, hi):
+            name_id = self.entry_names[i]
+            if self.entry_weights[i] > best.get(name_id, -1.0):
+                best[name_id] = self.entry_weights[i]
+        return sorted(((w, n) for n, w in best.items()), key=lambda x: (-x[0], self.names[x[1]]))[:k]
+
+
+def _build_prefix_index(index, columns):
+    """Completions over the given name columns of an index.
+
+    Weight: rows carrying the name (popularity, e.g. a font used by several
+    pairings) plus, as a tie-break below 1, the share of documents that
+    mention the name's rarest word.
+    """
+    bm25 = index.bm25
+    names = {}
+    for row in index.data:
+        for col in columns:
+            name = (row.get(col) or "").strip()
+            if name:
+                weight, fields = names.get(name, (0, []))
+                if col not in fields:
+                    fields.append(col)
+                names[name] = (weight + 1, fields)
+    for name, (weight, fields) in names.items():
+        dfs = [Postings(bm25, bm25.terms[t]).df for t in bm25.tokenize(name) if t in bm25.terms]
+        names[name] = (weight + (min(dfs) / (bm25.N + 1) if dfs else 0.0), fields)
+    return PrefixIndex(names)
 
 
 # ============ SEARCH FUNCTIONS ============
+_INDEX_CACHE = {}
+
+
+class SearchIndex:
+    """CSV rows plus the search structures built over them.
+
+    Combined indexes (several files in one) also carry the group each row came
+    from: group_names lists the groups and row_groups holds a group number per row.
+    sources are the data files merged in and stamps their layer files' (size, mtime)
+    at build time, so reload_data() can tell when the index is stale.
+    """
+
+    def __init__(self, data, bm25, group_names=None, row_groups=None, sources=(), stamps=()):
+        self.data = data
+        self.bm25 = bm25
+        self.group_names = group_names
+        self.row_groups = row_groups
+        self.sources = sources
+        self.stamps = stamps
+        self.prefixes = {}  # name columns -> PrefixIndex (see suggest)
+        self.field_values = {}  # column -> lowercased values (see boost)
+        self._colors = None
+        self.bitmaps = {}   # lowercase FILTER_COLS column -> lowercase value -> row bitset (int)
+        for idx, row in enumerate(data):
+            for col in FILTER_COLS:
+                value = row.get(col)
+                if value is not None:
+                    values = self.bitmaps.setdefault(col.lower(), {})
+                    key = value.strip().lower()
+                    values[key] = values.get(key, 0) | (1 << idx)
+        self._lsa = None
+
+    def project(self, idx, columns):
+        """Materialize only the given columns of one row"""
+        if isinstance(self.data, FrozenRows):
+            return self.data.project(idx, columns)
+        row = self.data[idx]
+        return {col: row[col] or "" for col in columns if col in row}
+
+    def freeze(self, build_lsa=False):
+        """Pack rows into flat buffers; optionally build the LSA index first"""
+        if build_lsa:
+            self.lsa
+        if not isinstance(self.data, FrozenRows):
+            self.data = FrozenRows(self.data)
+
+    def filter_mask(self, filters):
+        """Row mask (bytes, one bit per row) for {column: value or [values]}.
+
+        Values of one column are ORed, columns are ANDed; matching ignores case.
+        Raises ValueError for a column that has no bitmap in this index.
+        """
+        selected = (1 << len(self.data)) - 1
+        for column, values in filters.items():
+            bitmaps = self.bitmaps.get(column.strip().lower())
+            if bitmaps is None:
+                available = [col for col in FILTER_COLS if col.lower() in self.bitmaps]
+                raise ValueError(f"Cannot filter on {column}. Filterable here: {', '.join(available) or 'none'}")
+            column_bits = 0
+            for value in _as_values(values):
+                column_bits |= bitmaps.get(str(value).strip().lower(), 0)
+            selected &= column_bits
+        return selected.to_bytes((len(self.data) + 7) // 8, "little")
+
+    def _field_values(self, column):
+        """Lowercased column values, built once per column"""
+        return _build_once(self.field_values, column,
+                           lambda: [(row.get(column) or "").lower() for row in self.data])
+
+    def boost(self, boost_terms, mask=None):
+        """{row: bonus} for boost terms, scored like query terms (BOOST_TERM_WEIGHT)"""
+        return self.bm25.term_scores(self.bm25.tokenize(" ".join(boost_terms)), BOOST_TERM_WEIGHT, mask)
+
+    def prioritize(self, ranked, field_boosts, limit):
+        """Reorder the first limit hits of a ranking by field_boosts: (ranking, {row: bonus}).
+
+        field_boosts maps a column to values in priority order; a hit whose
+        column contains a value (or is contained in it) gets FIELD_BOOST scaled
+        down by the value's position, counting its best matching value only.
+        Only hits that already made the cut are lifted, so a row the query
+        doesn't match never outranks one it does.
+        """
+        top = [(idx, score) for idx, score in ranked[:limit] if score > 0]
+        bonus = defaultdict(float)
+        for column, values in field_boosts.items():
+            wanted = [str(value).lower().strip() for value in _as_values(values)]
+            cells = self._field_values(column)
+            for idx, _ in top:
+                cell = cells[idx]
+                for position, value in enumerate(wanted):
+                    if cell and value and (value in cell or cell in value):
+                        bonus[idx] += FIELD_BOOST * (len(wanted) - position) / len(wanted)
+                        break
+        top = sorted(((idx, score + bonus.get(idx, 0.0)) for idx, score in top), key=lambda x: (-x[1], x[0]))
+        return top + ranked[len(top):], bonus
+
+    def prefix_index(self, columns):
+        """PrefixIndex over the given name columns, built once"""
+        return _build_once(self.prefixes, tuple(columns), lambda: _build_prefix_index(self, columns))
+
+    @property
+    def colors(self):
+        """ColorIndex over the rows' hex columns, built on first use"""
+        return _build_once(vars(self), "_colors",
+                           lambda: ColorIndex(self.data, _row_key(self.sources[0]) if self.sources else None))
+
+    @property
+    def lsa(self):
+        """Latent semantic index, built on first use (None without NumPy)"""
+        if self._lsa is None and self.bm25.N and _load_numpy() is not None:
+            return _build_once(vars(self), "_lsa", lambda: LSAIndex(self.bm25))
+        return self._lsa
+
+    def rank(self, query, fuzzy=False, hybrid=False, explain=None, mask=None, bonus=None, limit=None):
+        """Rank documents lexically, or fuse BM25 with latent neighbours when hybrid.
+
+        limit is the number of results the caller keeps; hybrid fuses at least
+        that many lexical hits (all of them when None) so fusion never costs recall.
+        Quoted phrases ("dark mode", or "dark mode"~2 for proximity) restrict
+        results to documents containing them (see BM25.phrase_docs).
+        """
+        if '"' in query:
+            query, phrases = _parse_phrases(query)
+            if phrases:
+                mask = self.bm25.phrase_mask(phrases, mask)
+                if explain is not None:
+                    explain["phrases"] = [{"phrase": phrase, "slop": slop} for phrase, slop in phrases]
+        ranked = self.bm25.score(query, fuzzy, explain, mask, bonus)
+        if hybrid and self.lsa is not None:
+            dense = self.lsa.nearest(self.bm25.query_terms(query, fuzzy))
+            if mask is not None:
+                dense = [(doc, sim) for doc, sim in dense if mask[doc >> 3] >> (doc & 7) & 1]
+            if dense:
+                ranked = _fuse_rankings(ranked if limit is None else ranked[:max(limit, LSA_CANDIDATES)], dense)
+            if explain is not None and dense:
+                explain["fusion"] = "rrf"
+        return ranked
+
+
 def _load_csv(filepath):
     """Load CSV and return list of dicts"""
     with open(filepath, 'r', encoding='utf-8') as f:
         return list(csv.DictReader(f))
 
 
-def _search_csv(filepath, search_cols, output_cols, query, max_results):
-    """Core search function using BM25"""
-    if not filepath.exists():
-        return []
+_LAYER_CACHE = {}  # path -> ((size, mtime_ns), rows)
+
+
+def _stamp(path):
+    stat = path.stat()
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _load_layer(path):
+    """Parsed rows of one layer's copy of a file, re-read only when its size or mtime changes"""
+    stamp = _stamp(path)
+    cached = _LAYER_CACHE.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = _LAYER_CACHE[path] = (stamp, _load_csv(path))
+    return cached[1]
+
+
+def _row_key(filename):
+    """Configured key columns of a data file, or None"""
+    for config in CSV_CONFIG.values():
+        if config["file"] == filename:
+            return config.get("key")
+    if any(config["file"] == filename for config in STACK_CONFIG.values()):
+        return _STACK_COLS["key"]
+    return None
+
+
+def data_files(filename):
+    """Copies of a data file across DATA_DIRS, lowest priority first"""
+    return [directory / filename for directory in DATA_DIRS if (directory / filename).is_file()]
+
+
+def _layer_stamps(filenames):
+    return tuple((str(path), _stamp(path)) for filename in filenames for path in data_files(filename))
+
 
-    data = _load_csv(filepath)
+def load_data(filename, key_cols=None):
+    """Rows of a data file merged across DATA_DIRS.
 
-    # Build documents from search columns
+    A row whose key_cols values (default: the file's configured "key", compared
+    case-insensitively) match an earlier layer's row overrides it in place: its
+    non-empty cells replace the earlier ones. Other rows are appended; without
+    a key every overlay row is appended.
+    """
+    key_cols = key_cols or _row_key(filename)
+    rows = []
+    positions = {}
+    for path in data_files(filename):
+        for row in _load_layer(path):
+            if key_cols:
+                key = tuple((row.get(col) or "").strip().lower() for col in key_cols)
+                pos = positions.get(key)
+                if pos is not None:
+                    rows[pos] = {**rows[pos], **{col: value for col, value in row.items() if value}}
+                    continue
+                positions[key] = len(rows)
+            rows.append(row)
+    return rows
+
+
+def set_data_dirs(overlays):
+    """Replace the overlay layers (searched on top of DATA_DIR, lowest priority first) and reload"""
+    DATA_DIRS[:] = [DATA_DIR] + [Path(p) for p in overlays]
+    return reload_data()
+
+
+def reload_data():
+    """Drop indexes whose layer files changed; unchanged layers and indexes are reused.
+
+    Changed files are re-parsed and their merged indexes rebuilt on next use.
+    Returns the data files whose indexes were dropped.
+    """
+    global _ROUTER
+    changed = []
+    for key, index in list(_INDEX_CACHE.items()):
+        if _layer_stamps(index.sources) != index.stamps:
+            _INDEX_CACHE.pop(key, None)
+            changed.extend(index.sources)
+    if changed:
+        _ROUTER = None
+        _RESULT_CACHE.clear()
+    return sorted(set(changed))
+
+
+_DATA_VERSION = {}
+
+
+def data_version():
+    """Version of every data file in every layer, from one stat pass (no file reads).
+
+    Hashes each file's layer, relative name, size and mtime, so editing,
+    adding or removing a CSV in any layer changes the version.
+    """
+    stamps = []
+    for layer, directory in enumerate(DATA_DIRS):
+        for path in sorted(directory.rglob("*.csv")):
+            stat = path.stat()
+            stamps.append((layer, str(path.relative_to(directory)), stat.st_size, stat.st_mtime_ns))
+    stamps = tuple(stamps)
+    version = _DATA_VERSION.get(stamps)
+    if version is None:
+        version = hashlib.sha256(json.dumps(stamps).encode("utf-8")).hexdigest()[:16]
+        _DATA_VERSION.clear()
+        _DATA_VERSION[stamps] = version
+    return version
+
+
+def _get_index(filename, search_cols):
+    """Merged rows of a data file and their BM25 index, built once per file and column set"""
+    key = (filename, tuple(search_cols))
+    index = _INDEX_CACHE.get(key)
+    _note_cache(index is not None)
+    if index is None:
+        index = _build_once(_INDEX_CACHE, key, lambda: _build_index(filename, search_cols))
+    return index
+
+
+def _build_index(filename, search_cols):
+    """SearchIndex over one data file's merged layers (see _get_index)"""
+    stamps = _layer_stamps([filename])
+    data = load_data(filename)
     documents = [" ".join(str(row.get(col, "")) for col in search_cols) for row in data]
+    bm25 = BM25(analyzer=get_analyzer(_analyzer_domain(filename)), positions=INDEX_POSITIONS)
+    bm25.fit(documents)
+    return SearchIndex(data, bm25, sources=(filename,), stamps=stamps)
+
+
+def _project(output_cols, fields):
+    """Output columns restricted to the requested fields (case-insensitive, in request order).
+
+    Raises ValueError naming the valid columns if a field is not an output column.
+    """
+    if not fields:
+        return output_cols
+    by_name = {col.lower(): col for col in output_cols}
+    unknown = [f for f in fields if f.strip().lower() not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown field: {', '.join(unknown)}. Available: {', '.join(output_cols)}")
+    return [by_name[f.strip().lower()] for f in fields]
+
 
-    # BM25 search
-    bm25 = BM25()
+def _search_palettes(filename, search_cols, output_cols, colors, max_results, fields=None, filters=None):
+    """Rows whose palettes are nearest to the OKLab query colors, with their distances.
+
+    filters restrict the candidates as in _search_csv (raises ValueError for unknown columns).
+    """
+    if not data_files(filename):
+        return [], []
+    index = _get_index(filename, search_cols)
+    mask = index.filter_mask(filters) if filters else None
+    nearest = index.colors.nearest(colors, max_results, mask)
+    columns = _project(output_cols, fields)
+    return [index.project(idx, columns) for idx, _ in nearest], [round(d, 4) for _, d in nearest]
+
+
+def _get_stack_index():
+    """One index over every stack file (shared _STACK_COLS schema), files loaded in parallel"""
+    key = ("stacks", tuple(_STACK_COLS["search_cols"]))
+    index = _INDEX_CACHE.get(key)
+    _note_cache(index is not None)
+    if index is None:
+        index = _build_once(_INDEX_CACHE, key, _build_stack_index)
+    return index
+
+
+def _build_stack_index():
+    """SearchIndex over every stack file (see _get_stack_index)"""
+    names = [s for s in AVAILABLE_STACKS if data_files(STACK_CONFIG[s]["file"])]
+    sources = tuple(STACK_CONFIG[s]["file"] for s in names)
+    stamps = _layer_stamps(sources)
+    with ThreadPoolExecutor(max_workers=MAX_LOAD_WORKERS) as executor:
+        tables = list(executor.map(load_data, sources))
+    data = []
+    row_groups = array('H')
+    for group, rows in enumerate(tables):
+        data.extend(rows)
+        row_groups.extend([group] * len(rows))
+    documents = [" ".join(str(row.get(col, "")) for col in _STACK_COLS["search_cols"]) for row in data]
+    bm25 = BM25(analyzer=get_analyzer("stacks"), positions=INDEX_POSITIONS)
     bm25.fit(documents)
-    ranked = bm25.score(query)
+    return SearchIndex(data, bm25, names, row_groups, sources, stamps)
+
+
+def _search_csv(filename, search_cols, output_cols, query, max_results, fuzzy=False, hybrid=False, fields=None,
+                explain=None, filters=None, boost_terms=None, field_boosts=None):
+    """Core search function using BM25; only projected output columns are materialized.
+
+    explain, when a dict, receives the scoring pass statistics and one term
+    breakdown per returned row. filters restrict scoring to matching rows
+    (see SearchIndex.filter_mask; raises ValueError for unknown columns).
+    boost_terms add SearchIndex.boost bonuses to the scores; field_boosts then
+    reorder the returned hits (SearchIndex.prioritize).
+    """
+    if not data_files(filename):
+        return []
+
+    index = _get_index(filename, search_cols)
+    mask = index.filter_mask(filters) if filters else None
+    bonus = index.boost(boost_terms, mask) if boost_terms else None
+    ranked = index.rank(query, fuzzy, hybrid, explain, mask, bonus, max_results)
+    if field_boosts:
+        ranked, field_bonus = index.prioritize(ranked, field_boosts, max_results)
+        bonus = {idx: (bonus or {}).get(idx, 0.0) + field_bonus.get(idx, 0.0) for idx, _ in ranked[:max_results]}
+    columns = _project(output_cols, fields)
 
     # Get top results with score > 0
     results = []
     for idx, score in ranked[:max_results]:
         if score > 0:
-            row = data[idx]
-            results.append({col: row.get(col, "") for col in output_cols if col in row})
+            results.append(index.project(idx, columns))
 
+    if explain is not None:
+        bm25 = index.bm25
+        slots = explain.pop("slots")
+        explain.update({"k1": bm25.k1, "b": bm25.b, "avgdl": round(bm25.avgdl, 2), "results": [{
+            "score": round(score, 4),
+            "doc_length": bm25.doc_lengths[idx],
+            "boost": round(bonus.get(idx, 0.0), 4) if bonus else 0.0,
+            "terms": bm25.explain_hit(idx, slots.get(idx, []))
+        } for idx, score in ranked[:len(results)]]})
     return results
 
 
+# ============ DOMAIN ROUTING ============
+ROUTING_KEY_WEIGHT = 3.0      # Extra weight of a term found in a domain's key (name) columns
+ROUTING_KEYWORD_WEIGHT = 1.0  # Weight of a DOMAIN_KEYWORDS word for its domain
+
+
+class DomainRouter:
+    """Query router over IDF-weighted per-domain term centroids.
+
+    A domain's weight for a term is the fraction of its rows containing the
+    term (key-column hits count ROUTING_KEY_WEIGHT extra, so the domain with a
+    row named "Glassmorphism" beats one that merely mentions it), plus
+    ROUTING_KEYWORD_WEIGHT if the term is one of its DOMAIN_KEYWORDS, times the
+    term's IDF across domains. Normalizing by row count keeps large or verbose
+    domains from winning every query. A query sums its terms' weights per
+    domain in one pass, and scores are normalized into confidences.
+    """
+
+    def __init__(self, indexes, key_cols=None, keywords=None):
+        self.domains = list(indexes)
+        self.tokenize = get_analyzer().analyze
+        evidence = []   # per domain: term -> weight before IDF
+        for domain, index in indexes.items():
+            bm25 = index.bm25
+            weights = {term: Postings(bm25, term_id).df / bm25.N for term, term_id in bm25.terms.items()}
+            columns = (key_cols or {}).get(domain, [])
+            key_df = Counter()
+            for row in index.data:
+                key_df.update(set(bm25.tokenize(" ".join((row.get(col) or "") for col in columns))))
+            for term, df in key_df.items():
+                weights[term] = weights.get(term, 0.0) + ROUTING_KEY_WEIGHT * df / bm25.N
+            for keyword in (keywords or {}).get(domain, []):
+                for term in set(self.tokenize(keyword)):
+                    weights[term] = weights.get(term, 0.0) + ROUTING_KEYWORD_WEIGHT
+            evidence.append(weights)
+
+        self.vocabulary = {}                # term -> row in weights
+        self.weights = array('d')           # row-major: one value per domain
+        for row, term in enumerate(sorted(set().union(*evidence))):
+            self.vocabulary[term] = row
+            idf = log(1 + len(evidence) / sum(1 for w in evidence if term in w))
+            self.weights.extend(idf * w.get(term, 0.0) for w in evidence)
+
+    def freeze(self):
+        """Replace the term dict with a FrozenVocabulary (see freeze_indexes)"""
+        if isinstance(self.vocabulary, dict):
+            self.vocabulary = FrozenVocabulary(self.vocabulary)
+
+    def route(self, query, top_n=1):
+        """Return up to top_n (domain, confidence) pairs, best first; empty if no term is known"""
+        width = len(self.domains)
+        scores = [0.0] * width
+        for token in self.tokenize(query):
+            row = self.vocabulary.get(token)
+            if row is None:
+                continue
+            for i, value in enumerate(self.weights[row * width:(row + 1) * width]):
+                scores[i] += value
+        total = sum(scores)
+        if not total:
+            return []
+        ranked = sorted(zip(self.domains, scores), key=lambda x: x[1], reverse=True)
+        return [(domain, score / total) for domain, score in ranked[:top_n] if score > 0]
+
+
+_ROUTER = None
+
+
+def _get_router():
+    """Router over every CSV_CONFIG domain, built once from the cached indexes"""
+    global _ROUTER
+    router = _ROUTER
+    if router is None:
+        with _BUILD_LOCKS.setdefault("router", threading.Lock()):
+            router = _ROUTER
+            if router is None:
+                indexes = {}
+                for domain, config in CSV_CONFIG.items():
+                    if data_files(config["file"]):
+                        indexes[domain] = _get_index(config["file"], config["search_cols"])
+                key_cols = {domain: CSV_CONFIG[domain]["key"] for domain in indexes}
+                router = _ROUTER = DomainRouter(indexes, key_cols, DOMAIN_KEYWORDS)
+    return router
+
+
+def load_indexes(workers=MAX_LOAD_WORKERS):
+    """Build every CSV_CONFIG / STACK_CONFIG index, the combined stack index and the router in parallel.
+
+    Returns the loaded SearchIndex objects.
+    """
+    specs = [(c["file"], c["search_cols"]) for c in CSV_CONFIG.values()]
+    specs += [(c["file"], _STACK_COLS["search_cols"]) for c in STACK_CONFIG.values()]
+    specs = [(filename, cols) for filename, cols in specs if data_files(filename)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_get_index, filename, cols) for filename, cols in specs]
+        futures.append(executor.submit(_get_stack_index))
+        indexes = [f.result() for f in futures]
+    _get_router()
+    for domain, columns in SUGGEST_CONFIG.items():
+        config = CSV_CONFIG[domain]
+        if data_files(config["file"]):
+            _get_index(config["file"], config["search_cols"]).prefix_index(columns)
+    config = CSV_CONFIG["color"]
+    if data_files(config["file"]):
+        _get_index(config["file"], config["search_cols"]).colors
+    return indexes
+
+
+def top_queries(log_path, top_n=100):
+    """Most frequent (op, args) calls in an NDJSON query log, most frequent first"""
+    counts = Counter()
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                counts[json.dumps([entry["op"], entry["args"]], sort_keys=True)] += 1
+            except (ValueError, KeyError, TypeError):
+                continue
+    return [tuple(json.loads(call)) for call, _ in counts.most_common(top_n)]
+
+
+def freeze_indexes(build_lsa=False):
+    """Load every CSV_CONFIG / STACK_CONFIG index, pack it into flat buffers and gc.freeze() the heap.
+
+    Call once in a pre-fork server before forking workers. Rows and the router
+    vocabulary become bytes/array-backed (BM25 vocabularies already are), so
+    workers reading them don't write reference counts into the parent's pages,
+    and frozen objects are skipped by the cyclic GC, which would otherwise
+    touch every object header.
+    """
+    for index in load_indexes():
+        index.freeze(build_lsa)
+    _get_router().freeze()
+    _LAYER_CACHE.clear()  # Parsed dict rows; reload_data() re-parses a layer if its index is rebuilt
+    gc.collect()
+    gc.freeze()
+
+
+def route_domains(query, top_n=3):
+    """Rank domains for a query by how well their indexed data explains it"""
+    return _get_router().route(query, top_n)
+
+
 def detect_domain(query):
     """Auto-detect the most relevant domain from query"""
-    query_lower = query.lower()
-
-    domain_keywords = {
-        "color": ["color", "palette", "hex", "#", "rgb"],
-        "chart": ["chart", "graph", "visualization", "trend", "bar", "pie", "scatter", "heatmap", "funnel"],
-        "landing": ["landing", "page", "cta", "conversion", "hero", "testimonial", "pricing", "section"],
-        "product": ["saas", "ecommerce", "e-commerce", "fintech", "healthcare", "gaming", "portfolio", "crypto", "dashboard"],
-        "style": ["style", "design", "ui", "minimalism", "glassmorphism", "neumorphism", "brutalism", "dark mode", "flat", "aurora", "prompt", "css", "implementation", "variable", "checklist", "tailwind"],
-        "ux": ["ux", "usability", "accessibility", "wcag", "touch", "scroll", "animation", "keyboard", "navigation", "mobile"],
-        "typography": ["font", "typography", "heading", "serif", "sans"],
-        "icons": ["icon", "icons", "lucide", "heroicons", "symbol", "glyph", "pictogram", "svg icon"],
-        "react": ["react", "next.js", "nextjs", "suspense", "memo", "usecallback", "useeffect", "rerender", "bundle", "waterfall", "barrel", "dynamic import", "rsc", "server component"],
-        "web": ["aria", "focus", "outline", "semantic", "virtualize", "autocomplete", "form", "input type", "preconnect"]
-    }
-
-    scores = {domain: sum(1 for kw in keywords if kw in query_lower) for domain, keywords in domain_keywords.items()}
+    scores = _DOMAIN_MATCHER.counts(query.lower())
     best = max(scores, key=scores.get)
     return best if scores[best] > 0 else "style"
 
 
-def search(query, domain=None, max_results=MAX_RESULTS):
-    """Main search function with auto-domain detection"""
+@log_queries("search")
+@cache_results
+def search(query, domain=None, max_results=MAX_RESULTS, route="keyword", fuzzy=False, hybrid=False, fields=None,
+           explain=False, filters=None, boost_terms=None, field_boosts=None):
+    """Main search function with auto-domain detection.
+
+    route selects how a missing domain is chosen: "keyword" uses detect_domain,
+    "index" scores the query against every domain's indexed data.
+    fuzzy expands misspelled query words to their nearest indexed terms.
+    hybrid fuses BM25 with latent semantic neighbours (lexical only without NumPy).
+    fields limits each result to those output columns.
+    explain adds per-hit term breakdowns (tf, idf, length norm, contribution) and
+    scoring statistics under "explain", from the same scoring pass.
+    filters ({column: value or [values]}, FILTER_COLS only) limit scoring to
+    matching rows, e.g. {"Severity": "High", "Platform": ["Web", "All"]}.
+    In the color domain, hex codes in the query (e.g. "#1E40AF"; the alpha of "#1E40AF80" is ignored) rank palettes
+    by OKLab distance instead of BM25; distances are returned under "distances".
+    filters still apply there; boosts are rejected and explain reports itself unavailable.
+    boost_terms are extra words scored alongside the query (BOOST_TERM_WEIGHT);
+    field_boosts ({column: [values in priority order]}) reorder the returned
+    hits so those whose column contains a value come first, in priority order,
+    e.g. {"Style Category": ["Glassmorphism", "Minimalism"]}.
+    """
+    routing = None
     if domain is None:
-        domain = detect_domain(query)
+        if route == "index":
+            routing = route_domains(query)
+            domain = routing[0][0] if routing else detect_domain(query)
+        else:
+            domain = detect_domain(query)
 
     config = CSV_CONFIG.get(domain, CSV_CONFIG["style"])
-    filepath = DATA_DIR / config["file"]
 
-    if not filepath.exists():
-        return {"error": f"File not found: {filepath}", "domain": domain}
+    if not data_files(config["file"]):
+        return {"error": f"File not found: {DATA_DIR / config['file']}", "domain": domain}
 
-    results = _search_csv(filepath, config["search_cols"], config["output_cols"], query, max_results)
+    colors = [_hex_to_oklab(m.group(0)) for m in HEX_COLOR.finditer(query)] if domain == "color" else []
+    distances = None
+    details = {} if explain else None
+    if colors and (boost_terms or field_boosts):
+        return {"error": "boost_terms and field_boosts don't apply to color-code queries (ranked by OKLab distance)",
+                "domain": domain}
+    try:
+        if colors:
+            results, distances = _search_palettes(config["file"], config["search_cols"], config["output_cols"], colors,
+                                                  max_results, fields, filters)
+            if details is not None:
+                details = {"unavailable": "color-code queries are ranked by OKLab distance, not BM25 terms"}
+        else:
+            results = _search_csv(config["file"], config["search_cols"], config["output_cols"], query, max_results, fuzzy,
+                                  hybrid, fields, details, filters, boost_terms, field_boosts)
+    except ValueError as e:
+        return {"error": str(e), "domain": domain}
 
-    return {
+    result = {
         "domain": domain,
         "query": query,
         "file": config["file"],
         "count": len(results),
         "results": results
     }
+    if details is not None:
+        result["explain"] = details
+    if distances is not None:
+        result["distances"] = distances
+    if routing is not None:
+        result["routing"] = [{"domain": d, "confidence": round(c, 4)} for d, c in routing]
+    return result
+
 
+def palette_contrast(palette):
+    """Precomputed WCAG contrast report for a colors.csv row (a result dict or its Product Type), or None"""
+    config = CSV_CONFIG["color"]
+    if isinstance(palette, dict):
+        palette = " | ".join((palette.get(col) or "") for col in config["key"])
+    colors = _get_index(config["file"], config["search_cols"]).colors
+    row = colors.rows_by_key.get(palette.strip().lower())
+    return None if row is None else colors.contrast_report(row)
 
-def search_stack(query, stack, max_results=MAX_RESULTS):
-    """Search stack-specific guidelines"""
+
+def suggest(prefix, domain=None, k=SUGGEST_LIMIT):
+    """As-you-type completions for icon, font and style names (SUGGEST_CONFIG).
+
+    Ranked by a precomputed weight (see _build_prefix_index); without a domain,
+    completions from every configured domain are merged.
+    """
+    domains = list(SUGGEST_CONFIG) if domain is None else [domain]
+    unknown = [d for d in domains if d not in SUGGEST_CONFIG]
+    if unknown:
+        return {"error": f"No suggestions for domain: {unknown[0]}. Available: {', '.join(SUGGEST_CONFIG)}"}
+
+    candidates = []
+    for d in domains:
+        config = CSV_CONFIG[d]
+        prefixes = _get_index(config["file"], config["search_cols"]).prefix_index(SUGGEST_CONFIG[d])
+        for weight, name_id in prefixes.complete(prefix, k):
+            candidates.append((weight, prefixes.names[name_id], d, prefixes.fields[name_id]))
+    candidates.sort(key=lambda x: (-x[0], x[1]))
+    suggestions = [{"name": name, "domain": d, "fields": list(fields), "weight": round(weight, 4)}
+                   for weight, name, d, fields in candidates[:k]]
+    return {"prefix": prefix, "domain": domain, "count": len(suggestions), "suggestions": suggestions}
+
+
+def search_many(queries, domain, max_results=MAX_RESULTS, fuzzy=False, hybrid=False, fields=None):
+    """Search one domain for several queries in a batch; repeated queries are scored once"""
+    unique = {query: None for query in queries}
+    for query in unique:
+        unique[query] = search(query, domain, max_results, fuzzy=fuzzy, hybrid=hybrid, fields=fields)
+    return [unique[query] for query in queries]
+
+
+@log_queries("search_stack")
+@cache_results
+def search_stack(query, stack, max_results=MAX_RESULTS, fuzzy=False, hybrid=False, fields=None, explain=False,
+                 filters=None):
+    """Search stack-specific guidelines (explain and filters as in search())"""
     if stack not in STACK_CONFIG:
         return {"error": f"Unknown stack: {stack}. Available: {', '.join(AVAILABLE_STACKS)}"}
 
-    filepath = DATA_DIR / STACK_CONFIG[stack]["file"]
+    filename = STACK_CONFIG[stack]["file"]
 
-    if not filepath.exists():
-        return {"error": f"Stack file not found: {filepath}", "stack": stack}
+    if not data_files(filename):
+        return {"error": f"Stack file not found: {DATA_DIR / filename}", "stack": stack}
 
-    results = _search_csv(filepath, _STACK_COLS["search_cols"], _STACK_COLS["output_cols"], query, max_results)
+    details = {} if explain else None
+    try:
+        results = _search_csv(filename, _STACK_COLS["search_cols"], _STACK_COLS["output_cols"], query, max_results, fuzzy,
+                              hybrid, fields, details, filters)
+    except ValueError as e:
+        return {"error": str(e), "stack": stack}
 
-    return {
+    result = {
         "domain": "stack",
         "stack": stack,
         "query": query,
@@ -251,3 +2071,55 @@ def search_stack(query, stack, max_results=MAX_RESULTS):
         "count": len(results),
         "results": results
     }
+    if details is not None:
+        result["explain"] = details
+    return result
+
+
+@log_queries("search_stacks")
+@cache_results
+def search_stacks(query, stacks="all", max_results=MAX_RESULTS, fuzzy=False, hybrid=False, fields=None, filters=None):
+    """Compare stack guidelines: top results per stack from one pass over the combined stack index.
+
+    stacks is a list of stack names, one stack name, or "all". Scores use
+    statistics of the combined index, so they can differ slightly from
+    per-stack search_stack(). filters work as in search(). The ranking is
+    not cut before bucketing (rank() without a limit), so with hybrid no
+    stack loses the hits it has lexically.
+    """
+    if stacks == "all":
+        requested = AVAILABLE_STACKS
+    else:
+        requested = [stacks] if isinstance(stacks, str) else list(stacks)
+    unknown = [s for s in requested if s not in STACK_CONFIG]
+    if unknown:
+        return {"error": f"Unknown stack: {', '.join(unknown)}. Available: {', '.join(AVAILABLE_STACKS)}"}
+
+    index = _get_stack_index()
+    groups = {name: i for i, name in enumerate(index.group_names)}
+    wanted = {groups[s] for s in requested if s in groups}
+    try:
+        mask = index.filter_mask(filters) if filters else None
+        columns = _project(_STACK_COLS["output_cols"], fields)
+    except ValueError as e:
+        return {"error": str(e)}
+    buckets = {group: [] for group in wanted}
+    remaining = len(wanted)
+    for idx, score in index.rank(query, fuzzy, hybrid, mask=mask):
+        if remaining == 0 or score <= 0:
+            break
+        bucket = buckets.get(index.row_groups[idx])
+        if bucket is None or len(bucket) >= max_results:
+            continue
+        bucket.append(index.project(idx, columns))
+        if len(bucket) == max_results:
+            remaining -= 1
+
+    results = {s: buckets.get(groups.get(s), []) for s in requested}
+    return {
+        "domain": "stack",
+        "stacks": requested,
+        "query": query,
+        "count": sum(len(rows) for rows in results.values()),
+        "results": results
+    }
@@ -8,21 +8,30 @@ Usage:
     from design_system import generate_design_system
     result = generate_design_system("SaaS dashboard", "My Project")
     
+    # Bypass the on-disk cache (UIPRO_CACHE_DIR, keyed by query, project and data version)
+    result = generate_design_system("SaaS dashboard", "My Project", use_cache=False)
+
     # With persistence (Master + Overrides pattern)
     result = generate_design_system("SaaS dashboard", "My Project", persist=True)
     result = generate_design_system("SaaS dashboard", "My Project", persist=True, page="dashboard")
 """
 
-import csv
+import hashlib
 import json
 import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from core import search, DATA_DIR
+from typing import Callable, Iterator, TextIO
+from core import search, search_many, load_data, palette_contrast, KeywordMatcher, data_version, log_queries, _note_cache
 
 
 # ============ CONFIGURATION ============
 REASONING_FILE = "ui-reasoning.csv"
+REASONING_KEY = ["UI_Category"]  # Overlay rows with the same category replace bundled rules
 
 SEARCH_CONFIG = {
     "product": {"max_results": 1},
@@ -32,6 +41,35 @@ SEARCH_CONFIG = {
     "typography": {"max_results": 2}
 }
 
+# On-disk cache of generated design systems (shared across processes)
+CACHE_DIR = Path(os.environ.get("UIPRO_CACHE_DIR", Path.home() / ".cache" / "ui-ux-pro-max" / "design-systems"))
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_FORMAT = 6  # Bump when the cached dict or rendered output changes shape
+
+# Per-page override searches (domain -> max_results), batched across pages
+OVERRIDE_SEARCH_CONFIG = {
+    "style": 1,
+    "ux": 3,
+    "landing": 1
+}
+MAX_PAGE_WORKERS = 8
+
+# Page type -> context keywords, checked in order (first match wins)
+PAGE_PATTERNS = {
+    "Dashboard / Data View": ["dashboard", "admin", "analytics", "data", "metrics", "stats", "monitor", "overview"],
+    "Checkout / Payment": ["checkout", "payment", "cart", "purchase", "order", "billing"],
+    "Settings / Profile": ["settings", "profile", "account", "preferences", "config"],
+    "Landing / Marketing": ["landing", "marketing", "homepage", "hero", "home", "promo"],
+    "Authentication": ["login", "signin", "signup", "register", "auth", "password"],
+    "Pricing / Plans": ["pricing", "plans", "subscription", "tiers", "packages"],
+    "Blog / Article": ["blog", "article", "post", "news", "content", "story"],
+    "Product Detail": ["product", "item", "detail", "pdp", "shop", "store"],
+    "Search Results": ["search", "results", "browse", "filter", "catalog", "list"],
+    "Empty State": ["empty", "404", "error", "not found", "zero"],
+}
+
+_PAGE_MATCHER = KeywordMatcher(PAGE_PATTERNS)
+
 
 # ============ DESIGN SYSTEM GENERATOR ============
 class DesignSystemGenerator:
@@ -42,21 +80,16 @@ class DesignSystemGenerator:
 
     def _load_reasoning(self) -> list:
         """Load reasoning rules from CSV."""
-        filepath = DATA_DIR / REASONING_FILE
-        if not filepath.exists():
-            return []
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return list(csv.DictReader(f))
+        return load_data(REASONING_FILE, REASONING_KEY)
 
     def _multi_domain_search(self, query: str, style_priority: list = None) -> dict:
         """Execute searches across multiple domains."""
         results = {}
         for domain, config in SEARCH_CONFIG.items():
             if domain == "style" and style_priority:
-                # For style, also search with priority keywords
-                priority_query = " ".join(style_priority[:2]) if style_priority else query
-                combined_query = f"{query} {priority_query}"
-                results[domain] = search(combined_query, domain, config["max_results"])
+                # Priority words score with the query; named priority styles among the hits come first
+                results[domain] = search(query, domain, config["max_results"], boost_terms=style_priority[:2],
+                                         field_boosts={"Style Category": style_priority})
             else:
                 results[domain] = search(query, domain, config["max_results"])
         return results
@@ -119,42 +152,16 @@ class DesignSystemGenerator:
             "severity": rule.get("Severity", "MEDIUM")
         }
 
-    def _select_best_match(self, results: list, priority_keywords: list) -> dict:
-        """Select best matching result based on priority keywords."""
-        if not results:
-            return {}
-
-        if not priority_keywords:
-            return results[0]
-
-        # First: try exact style name match
-        for priority in priority_keywords:
-            priority_lower = priority.lower().strip()
-            for result in results:
-                style_name = result.get("Style Category", "").lower()
-                if priority_lower in style_name or style_name in priority_lower:
-                    return result
-
-        # Second: score by keyword match in all fields
-        scored = []
+    def _select_accessible_palette(self, results: list) -> tuple:
+        """Best-ranked palette meeting the most WCAG contrast requirements, with its contrast report."""
+        best, best_report = {}, {}
         for result in results:
-            result_str = str(result).lower()
-            score = 0
-            for kw in priority_keywords:
-                kw_lower = kw.lower().strip()
-                # Higher score for style name match
-                if kw_lower in result.get("Style Category", "").lower():
-                    score += 10
-                # Lower score for keyword field match
-                elif kw_lower in result.get("Keywords", "").lower():
-                    score += 3
-                # Even lower for other field matches
-                elif kw_lower in result_str:
-                    score += 1
-            scored.append((score, result))
-
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return scored[0][1] if scored and scored[0][0] > 0 else results[0]
+            report = palette_contrast(result) or {}
+            if not best or report.get("passed", 0) > best_report.get("passed", 0):
+                best, best_report = result, report
+            if report.get("accessible"):
+                break
+        return best, best_report
 
     def _extract_results(self, search_result: dict) -> list:
         """Extract results list from search result dict."""
@@ -183,8 +190,8 @@ class DesignSystemGenerator:
         typography_results = self._extract_results(search_results.get("typography", {}))
         landing_results = self._extract_results(search_results.get("landing", {}))
 
-        best_style = self._select_best_match(style_results, reasoning.get("style_priority", []))
-        best_color = color_results[0] if color_results else {}
+        best_style = style_results[0] if style_results else {}
+        best_color, color_contrast = self._select_accessible_palette(color_results)
         best_typography = typography_results[0] if typography_results else {}
         best_landing = landing_results[0] if landing_results else {}
 
@@ -219,7 +226,8 @@ class DesignSystemGenerator:
                 "cta": best_color.get("CTA (Hex)", "#F97316"),
                 "background": best_color.get("Background (Hex)", "#F8FAFC"),
                 "text": best_color.get("Text (Hex)", "#1E293B"),
-                "notes": best_color.get("Notes", "")
+                "notes": best_color.get("Notes", ""),
+                "contrast": color_contrast
             },
             "typography": {
                 "heading": best_typography.get("Heading Font", "Inter"),
@@ -239,8 +247,50 @@ class DesignSystemGenerator:
 # ============ OUTPUT FORMATTERS ============
 BOX_WIDTH = 90  # Wider box for more content
 
+
+@lru_cache(maxsize=1024)
+def _wrap_text(text: str, prefix: str, width: int) -> tuple:
+    """Wrap long text into multiple lines (words split once, result cached per field value)."""
+    if not text:
+        return ()
+    limit = width - 2
+    lines = []
+    line_words = []
+    length = len(prefix)
+    for word in text.split():
+        if length + len(word) + 1 <= limit:
+            length += len(word) + (1 if line_words else 0)
+            line_words.append(word)
+        else:
+            if line_words:
+                lines.append(prefix + " ".join(line_words))
+            line_words = [word]
+            length = len(prefix) + len(word)
+    if line_words:
+        lines.append(prefix + " ".join(line_words))
+    return tuple(lines)
+
+
+def write_lines(lines: Iterator[str], stream: TextIO) -> None:
+    """Stream rendered lines to a text stream (file or stdout), newline-separated."""
+    for i, line in enumerate(lines):
+        if i:
+            stream.write("\n")
+        stream.write(line)
+
+
 def format_ascii_box(design_system: dict) -> str:
     """Format design system as ASCII box with emojis (MCP-style)."""
+    return "\n".join(iter_ascii_box(design_system))
+
+
+def format_markdown(design_system: dict) -> str:
+    """Format design system as markdown."""
+    return "\n".join(iter_markdown(design_system))
+
+
+def iter_ascii_box(design_system: dict) -> Iterator[str]:
+    """Render design system as ASCII box lines with emojis (MCP-style)."""
     project = design_system.get("project_name", "PROJECT")
     pattern = design_system.get("pattern", {})
     style = design_system.get("style", {})
@@ -249,103 +299,84 @@ def format_ascii_box(design_system: dict) -> str:
     effects = design_system.get("key_effects", "")
     anti_patterns = design_system.get("anti_patterns", "")
 
-    def wrap_text(text: str, prefix: str, width: int) -> list:
-        """Wrap long text into multiple lines."""
-        if not text:
-            return []
-        words = text.split()
-        lines = []
-        current_line = prefix
-        for word in words:
-            if len(current_line) + len(word) + 1 <= width - 2:
-                current_line += (" " if current_line != prefix else "") + word
-            else:
-                if current_line != prefix:
-                    lines.append(current_line)
-                current_line = prefix + word
-        if current_line != prefix:
-            lines.append(current_line)
-        return lines
-
     # Build sections from pattern
     sections = pattern.get("sections", "").split(">")
     sections = [s.strip() for s in sections if s.strip()]
 
     # Build output lines
-    lines = []
     w = BOX_WIDTH - 1
 
-    lines.append("+" + "-" * w + "+")
-    lines.append(f"|  TARGET: {project} - RECOMMENDED DESIGN SYSTEM".ljust(BOX_WIDTH) + "|")
-    lines.append("+" + "-" * w + "+")
-    lines.append("|" + " " * BOX_WIDTH + "|")
+    yield "+" + "-" * w + "+"
+    yield f"|  TARGET: {project} - RECOMMENDED DESIGN SYSTEM".ljust(BOX_WIDTH) + "|"
+    yield "+" + "-" * w + "+"
+    yield "|" + " " * BOX_WIDTH + "|"
 
     # Pattern section
-    lines.append(f"|  PATTERN: {pattern.get('name', '')}".ljust(BOX_WIDTH) + "|")
+    yield f"|  PATTERN: {pattern.get('name', '')}".ljust(BOX_WIDTH) + "|"
     if pattern.get('conversion'):
-        lines.append(f"|     Conversion: {pattern.get('conversion', '')}".ljust(BOX_WIDTH) + "|")
+        yield f"|     Conversion: {pattern.get('conversion', '')}".ljust(BOX_WIDTH) + "|"
     if pattern.get('cta_placement'):
-        lines.append(f"|     CTA: {pattern.get('cta_placement', '')}".ljust(BOX_WIDTH) + "|")
-    lines.append("|     Sections:".ljust(BOX_WIDTH) + "|")
+        yield f"|     CTA: {pattern.get('cta_placement', '')}".ljust(BOX_WIDTH) + "|"
+    yield "|     Sections:".ljust(BOX_WIDTH) + "|"
     for i, section in enumerate(sections, 1):
-        lines.append(f"|       {i}. {section}".ljust(BOX_WIDTH) + "|")
-    lines.append("|" + " " * BOX_WIDTH + "|")
+        yield f"|       {i}. {section}".ljust(BOX_WIDTH) + "|"
+    yield "|" + " " * BOX_WIDTH + "|"
 
     # Style section
-    lines.append(f"|  STYLE: {style.get('name', '')}".ljust(BOX_WIDTH) + "|")
+    yield f"|  STYLE: {style.get('name', '')}".ljust(BOX_WIDTH) + "|"
     if style.get("keywords"):
-        for line in wrap_text(f"Keywords: {style.get('keywords', '')}", "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
+        for line in _wrap_text(f"Keywords: {style.get('keywords', '')}", "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
     if style.get("best_for"):
-        for line in wrap_text(f"Best For: {style.get('best_for', '')}", "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
+        for line in _wrap_text(f"Best For: {style.get('best_for', '')}", "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
     if style.get("performance") or style.get("accessibility"):
         perf_a11y = f"Performance: {style.get('performance', '')} | Accessibility: {style.get('accessibility', '')}"
-        lines.append(f"|     {perf_a11y}".ljust(BOX_WIDTH) + "|")
-    lines.append("|" + " " * BOX_WIDTH + "|")
+        yield f"|     {perf_a11y}".ljust(BOX_WIDTH) + "|"
+    yield "|" + " " * BOX_WIDTH + "|"
 
     # Colors section
-    lines.append("|  COLORS:".ljust(BOX_WIDTH) + "|")
-    lines.append(f"|     Primary:    {colors.get('primary', '')}".ljust(BOX_WIDTH) + "|")
-    lines.append(f"|     Secondary:  {colors.get('secondary', '')}".ljust(BOX_WIDTH) + "|")
-    lines.append(f"|     CTA:        {colors.get('cta', '')}".ljust(BOX_WIDTH) + "|")
-    lines.append(f"|     Background: {colors.get('background', '')}".ljust(BOX_WIDTH) + "|")
-    lines.append(f"|     Text:       {colors.get('text', '')}".ljust(BOX_WIDTH) + "|")
+    yield "|  COLORS:".ljust(BOX_WIDTH) + "|"
+    yield f"|     Primary:    {colors.get('primary', '')}".ljust(BOX_WIDTH) + "|"
+    yield f"|     Secondary:  {colors.get('secondary', '')}".ljust(BOX_WIDTH) + "|"
+    yield f"|     CTA:        {colors.get('cta', '')}".ljust(BOX_WIDTH) + "|"
+    yield f"|     Background: {colors.get('background', '')}".ljust(BOX_WIDTH) + "|"
+    yield f"|     Text:       {colors.get('text', '')}".ljust(BOX_WIDTH) + "|"
     if colors.get("notes"):
-        for line in wrap_text(f"Notes: {colors.get('notes', '')}", "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
-    lines.append("|" + " " * BOX_WIDTH + "|")
+        for line in _wrap_text(f"Notes: {colors.get('notes', '')}", "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
+    yield "|" + " " * BOX_WIDTH + "|"
 
     # Typography section
-    lines.append(f"|  TYPOGRAPHY: {typography.get('heading', '')} / {typography.get('body', '')}".ljust(BOX_WIDTH) + "|")
+    yield f"|  TYPOGRAPHY: {typography.get('heading', '')} / {typography.get('body', '')}".ljust(BOX_WIDTH) + "|"
     if typography.get("mood"):
-        for line in wrap_text(f"Mood: {typography.get('mood', '')}", "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
+        for line in _wrap_text(f"Mood: {typography.get('mood', '')}", "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
     if typography.get("best_for"):
-        for line in wrap_text(f"Best For: {typography.get('best_for', '')}", "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
+        for line in _wrap_text(f"Best For: {typography.get('best_for', '')}", "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
     if typography.get("google_fonts_url"):
-        lines.append(f"|     Google Fonts: {typography.get('google_fonts_url', '')}".ljust(BOX_WIDTH) + "|")
+        yield f"|     Google Fonts: {typography.get('google_fonts_url', '')}".ljust(BOX_WIDTH) + "|"
     if typography.get("css_import"):
-        lines.append(f"|     CSS Import: {typography.get('css_import', '')[:70]}...".ljust(BOX_WIDTH) + "|")
-    lines.append("|" + " " * BOX_WIDTH + "|")
+        yield f"|     CSS Import: {typography.get('css_import', '')[:70]}...".ljust(BOX_WIDTH) + "|"
+    yield "|" + " " * BOX_WIDTH + "|"
 
     # Key Effects section
     if effects:
-        lines.append("|  KEY EFFECTS:".ljust(BOX_WIDTH) + "|")
-        for line in wrap_text(effects, "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
-        lines.append("|" + " " * BOX_WIDTH + "|")
+        yield "|  KEY EFFECTS:".ljust(BOX_WIDTH) + "|"
+        for line in _wrap_text(effects, "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
+        yield "|" + " " * BOX_WIDTH + "|"
 
     # Anti-patterns section
     if anti_patterns:
-        lines.append("|  AVOID (Anti-patterns):".ljust(BOX_WIDTH) + "|")
-        for line in wrap_text(anti_patterns, "|     ", BOX_WIDTH):
-            lines.append(line.ljust(BOX_WIDTH) + "|")
-        lines.append("|" + " " * BOX_WIDTH + "|")
+        yield "|  AVOID (Anti-patterns):".ljust(BOX_WIDTH) + "|"
+        for line in _wrap_text(anti_patterns, "|     ", BOX_WIDTH):
+            yield line.ljust(BOX_WIDTH) + "|"
+        yield "|" + " " * BOX_WIDTH + "|"
 
     # Pre-Delivery Checklist section
-    lines.append("|  PRE-DELIVERY CHECKLIST:".ljust(BOX_WIDTH) + "|")
+    yield "|  PRE-DELIVERY CHECKLIST:".ljust(BOX_WIDTH) + "|"
     checklist_items = [
         "[ ] No emojis as icons (use SVG: Heroicons/Lucide)",
         "[ ] cursor-pointer on all clickable elements",
@@ -356,16 +387,14 @@ def format_ascii_box(design_system: dict) -> str:
         "[ ] Responsive: 375px, 768px, 1024px, 1440px"
     ]
     for item in checklist_items:
-        lines.append(f"|     {item}".ljust(BOX_WIDTH) + "|")
-    lines.append("|" + " " * BOX_WIDTH + "|")
+        yield f"|     {item}".ljust(BOX_WIDTH) + "|"
+    yield "|" + " " * BOX_WIDTH + "|"
 
-    lines.append("+" + "-" * w + "+")
+    yield "+" + "-" * w + "+"
 
-    return "\n".join(lines)
 
-
-def format_markdown(design_system: dict) -> str:
-    """Format design system as markdown."""
+def iter_markdown(design_system: dict) -> Iterator[str]:
+    """Render design system as markdown lines."""
     project = design_system.get("project_name", "PROJECT")
     pattern = design_system.get("pattern", {})
     style = design_system.get("style", {})
@@ -374,93 +403,92 @@ def format_markdown(design_system: dict) -> str:
     effects = design_system.get("key_effects", "")
     anti_patterns = design_system.get("anti_patterns", "")
 
-    lines = []
-    lines.append(f"## Design System: {project}")
-    lines.append("")
+    yield f"## Design System: {project}"
+    yield ""
 
     # Pattern section
-    lines.append("### Pattern")
-    lines.append(f"- **Name:** {pattern.get('name', '')}")
+    yield "### Pattern"
+    yield f"- **Name:** {pattern.get('name', '')}"
     if pattern.get('conversion'):
-        lines.append(f"- **Conversion Focus:** {pattern.get('conversion', '')}")
+        yield f"- **Conversion Focus:** {pattern.get('conversion', '')}"
     if pattern.get('cta_placement'):
-        lines.append(f"- **CTA Placement:** {pattern.get('cta_placement', '')}")
+        yield f"- **CTA Placement:** {pattern.get('cta_placement', '')}"
     if pattern.get('color_strategy'):
-        lines.append(f"- **Color Strategy:** {pattern.get('color_strategy', '')}")
-    lines.append(f"- **Sections:** {pattern.get('sections', '')}")
-    lines.append("")
+        yield f"- **Color Strategy:** {pattern.get('color_strategy', '')}"
+    yield f"- **Sections:** {pattern.get('sections', '')}"
+    yield ""
 
     # Style section
-    lines.append("### Style")
-    lines.append(f"- **Name:** {style.get('name', '')}")
+    yield "### Style"
+    yield f"- **Name:** {style.get('name', '')}"
     if style.get('keywords'):
-        lines.append(f"- **Keywords:** {style.get('keywords', '')}")
+        yield f"- **Keywords:** {style.get('keywords', '')}"
     if style.get('best_for'):
-        lines.append(f"- **Best For:** {style.get('best_for', '')}")
+        yield f"- **Best For:** {style.get('best_for', '')}"
     if style.get('performance') or style.get('accessibility'):
-        lines.append(f"- **Performance:** {style.get('performance', '')} | **Accessibility:** {style.get('accessibility', '')}")
-    lines.append("")
+        yield f"- **Performance:** {style.get('performance', '')} | **Accessibility:** {style.get('accessibility', '')}"
+    yield ""
 
     # Colors section
-    lines.append("### Colors")
-    lines.append(f"| Role | Hex |")
-    lines.append(f"|------|-----|")
-    lines.append(f"| Primary | {colors.get('primary', '')} |")
-    lines.append(f"| Secondary | {colors.get('secondary', '')} |")
-    lines.append(f"| CTA | {colors.get('cta', '')} |")
-    lines.append(f"| Background | {colors.get('background', '')} |")
-    lines.append(f"| Text | {colors.get('text', '')} |")
+    yield "### Colors"
+    yield f"| Role | Hex |"
+    yield f"|------|-----|"
+    yield f"| Primary | {colors.get('primary', '')} |"
+    yield f"| Secondary | {colors.get('secondary', '')} |"
+    yield f"| CTA | {colors.get('cta', '')} |"
+    yield f"| Background | {colors.get('background', '')} |"
+    yield f"| Text | {colors.get('text', '')} |"
     if colors.get("notes"):
-        lines.append(f"\n*Notes: {colors.get('notes', '')}*")
-    lines.append("")
+        yield f"\n*Notes: {colors.get('notes', '')}*"
+    yield ""
 
     # Typography section
-    lines.append("### Typography")
-    lines.append(f"- **Heading:** {typography.get('heading', '')}")
-    lines.append(f"- **Body:** {typography.get('body', '')}")
+    yield "### Typography"
+    yield f"- **Heading:** {typography.get('heading', '')}"
+    yield f"- **Body:** {typography.get('body', '')}"
     if typography.get("mood"):
-        lines.append(f"- **Mood:** {typography.get('mood', '')}")
+        yield f"- **Mood:** {typography.get('mood', '')}"
     if typography.get("best_for"):
-        lines.append(f"- **Best For:** {typography.get('best_for', '')}")
+        yield f"- **Best For:** {typography.get('best_for', '')}"
     if typography.get("google_fonts_url"):
-        lines.append(f"- **Google Fonts:** {typography.get('google_fonts_url', '')}")
+        yield f"- **Google Fonts:** {typography.get('google_fonts_url', '')}"
     if typography.get("css_import"):
-        lines.append(f"- **CSS Import:**")
-        lines.append(f"```css")
-        lines.append(f"{typography.get('css_import', '')}")
-        lines.append(f"```")
-    lines.append("")
+        yield f"- **CSS Import:**"
+        yield f"```css"
+        yield f"{typography.get('css_import', '')}"
+        yield f"```"
+    yield ""
 
     # Key Effects section
     if effects:
-        lines.append("### Key Effects")
-        lines.append(f"{effects}")
-        lines.append("")
+        yield "### Key Effects"
+        yield f"{effects}"
+        yield ""
 
     # Anti-patterns section
     if anti_patterns:
-        lines.append("### Avoid (Anti-patterns)")
+        yield "### Avoid (Anti-patterns)"
         newline_bullet = '\n- '
-        lines.append(f"- {anti_patterns.replace(' + ', newline_bullet)}")
-        lines.append("")
+        yield f"- {anti_patterns.replace(' + ', newline_bullet)}"
+        yield ""
 
     # Pre-Delivery Checklist section
-    lines.append("### Pre-Delivery Checklist")
-    lines.append("- [ ] No emojis as icons (use SVG: Heroicons/Lucide)")
-    lines.append("- [ ] cursor-pointer on all clickable elements")
-    lines.append("- [ ] Hover states with smooth transitions (150-300ms)")
-    lines.append("- [ ] Light mode: text contrast 4.5:1 minimum")
-    lines.append("- [ ] Focus states visible for keyboard nav")
-    lines.append("- [ ] prefers-reduced-motion respected")
-    lines.append("- [ ] Responsive: 375px, 768px, 1024px, 1440px")
-    lines.append("")
-
-    return "\n".join(lines)
+    yield "### Pre-Delivery Checklist"
+    yield "- [ ] No emojis as icons (use SVG: Heroicons/Lucide)"
+    yield "- [ ] cursor-pointer on all clickable elements"
+    yield "- [ ] Hover states with smooth transitions (150-300ms)"
+    yield "- [ ] Light mode: text contrast 4.5:1 minimum"
+    yield "- [ ] Focus states visible for keyboard nav"
+    yield "- [ ] prefers-reduced-motion respected"
+    yield "- [ ] Responsive: 375px, 768px, 1024px, 1440px"
+    yield ""
 
 
 # ============ MAIN ENTRY POINT ============
+@log_queries("design_system")
 def generate_design_system(query: str, project_name: str = None, output_format: str = "ascii", 
-                           persist: bool = False, page: str = None, output_dir: str = None) -> str:
+                           persist: bool = False, page: str = None, output_dir: str = None,
+                           use_cache: bool = True, pages: list = None, stream: TextIO = None) -> str:
     """
     Main entry point for design system generation.
 
@@ -471,35 +499,187 @@ def generate_design_system(query: str, project_name: str = None, output_format:
         persist: If True, save design system to design-system/ folder
         page: Optional page name for page-specific override file
         output_dir: Optional output directory (defaults to current working directory)
+        use_cache: If True, reuse (and store) results in the on-disk cache
+        pages: Optional list of page names; all override files are generated in one pass
+        stream: Optional text stream; the output is written there line by line instead of returned
 
     Returns:
-        Formatted design system string
+        Formatted design system string (None when written to stream)
     """
-    generator = DesignSystemGenerator()
-    design_system = generator.generate(query, project_name)
+    cache_key = _cache_key(query, project_name)
+    entry = _cache_read(cache_key) if use_cache else None
+    _note_cache(entry is not None)
+    if entry is None:
+        generator = DesignSystemGenerator()
+        entry = {"design_system": generator.generate(query, project_name)}
+        if use_cache:
+            _cache_write(cache_key, entry)
     
     # Persist to files if requested
     if persist:
-        persist_design_system(design_system, page, output_dir, query)
+        persist_design_system(entry["design_system"], page, output_dir, query, pages=pages)
+
+    render = iter_markdown if output_format == "markdown" else iter_ascii_box
+    if stream is not None:
+        write_lines(render(entry["design_system"]), stream)
+        return None
+    return "\n".join(render(entry["design_system"]))
+
+
+# ============ CACHE FUNCTIONS ============
+def _cache_key(query: str, project_name: str = None) -> str:
+    """Content address: normalized query, project name, data version and cache format."""
+    normalized = " ".join(query.lower().split())
+    payload = json.dumps([CACHE_FORMAT, normalized, project_name, data_version()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_read(key: str) -> dict:
+    """Return a cached entry, or None on a miss or unreadable file."""
+    path = CACHE_DIR / f"{key}.json"
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        os.utime(path)  # Refresh recency for eviction
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_write(key: str, entry: dict) -> None:
+    """Atomically store an entry, then evict least recently used files over CACHE_MAX_BYTES."""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _atomic_write(CACHE_DIR / f"{key}.json", json.dumps(entry, ensure_ascii=False))
+        files = [(p.stat(), p) for p in CACHE_DIR.glob("*.json")]
+    except OSError:
+        return  # The cache is best-effort; generation already succeeded
+    total = sum(st.st_size for st, _ in files)
+    for st, path in sorted(files, key=lambda f: f[0].st_mtime):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            path.unlink()
+            total -= st.st_size
+        except OSError:
+            pass
+
+
+def _atomic_write(path: Path, content: str) -> None:
+    """Write content to a temp file in the same directory, then rename it into place."""
+    with _AtomicFile(path) as f:
+        f.write(content)
+
 
-    if output_format == "markdown":
-        return format_markdown(design_system)
-    return format_ascii_box(design_system)
+class _AtomicFile:
+    """Temp file beside path that replaces it on commit() or successful exit, else is removed."""
 
+    def __init__(self, path: Path):
+        self.path = path
+        fd, self.tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        self.file = os.fdopen(fd, 'w', encoding='utf-8')
+        self.finished = False
 
-# ============ PERSISTENCE FUNCTIONS ============
-def persist_design_system(design_system: dict, page: str = None, output_dir: str = None, page_query: str = None) -> dict:
+    def write(self, text: str) -> None:
+        self.file.write(text)
+
+    def commit(self) -> None:
+        """Move the temp file into place, keeping the existing file mode (0644 for new files)."""
+        self.file.close()
+        try:
+            mode = self.path.stat().st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.chmod(self.tmp_path, mode)
+        os.replace(self.tmp_path, self.path)
+        self.finished = True
+
+    def discard(self) -> None:
+        self.file.close()
+        self.finished = True
+        try:
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.finished:
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+_GENERATED_LINE = re.compile(r"^(> )?\*\*Generated:\*\* ")
+
+
+def _update_hash(digest, text: str) -> None:
+    """Feed text to digest line by line, skipping the volatile Generated timestamp line."""
+    for line in text.split("\n"):
+        if not _GENERATED_LINE.match(line):
+            digest.update(line.encode("utf-8"))
+            digest.update(b"\n")
+
+
+def _file_hash(path: Path) -> str:
+    """Timestamp-insensitive hash of an existing file, or None if it can't be read."""
+    digest = hashlib.sha256()
+    line = "\n"
+    try:
+        with open(path, 'r', encoding='utf-8') as f:  # Universal newlines: CRLF files written on Windows match
+            for line in f:
+                _update_hash(digest, line.rstrip("\n"))
+    except (OSError, UnicodeDecodeError):
+        return None
+    if line.endswith("\n"):  # Text after the final newline is an (empty) line too
+        _update_hash(digest, "")
+    return digest.hexdigest()
+
+
+def _write_if_changed(path: Path, render: Callable[[], Iterator[str]]) -> bool:
+    """Hash render()'s lines; only if they differ from path, render again into a temp file that replaces it.
+
+    Unchanged content touches nothing on disk (no temp file, no directory mtime change).
+    """
+    digest = hashlib.sha256()
+    for line in render():
+        _update_hash(digest, line)
+    if digest.hexdigest() == _file_hash(path):
+        return False
+    with _AtomicFile(path) as f:
+        for i, line in enumerate(render()):
+            if i:
+                f.write("\n")
+            f.write(line)
+    return True
+
+
+def _page_slug(page_name: str) -> str:
+    """File name stem of a page override."""
+    return page_name.lower().replace(' ', '-')
+
+
+def persist_design_system(design_system: dict, page: str = None, output_dir: str = None, page_query: str = None,
+                          pages: list = None) -> dict:
     """
     Persist design system to design-system/<project>/ folder using Master + Overrides pattern.
+
+    Files are only rewritten when their content (ignoring the Generated timestamp)
+    changes, so unchanged design systems don't trigger file watchers.
     
     Args:
         design_system: The generated design system dictionary
         page: Optional page name for page-specific override file
         output_dir: Optional output directory (defaults to current working directory)
         page_query: Optional query string for intelligent page override generation
+        pages: Optional list of page names, persisted in the same call as page
     
     Returns:
-        dict with created file paths and status
+        dict with target file paths, the subset actually written, and status
     """
     base_dir = Path(output_dir) if output_dir else Path.cwd()
     
@@ -511,6 +691,7 @@ def persist_design_system(design_system: dict, page: str = None, output_dir: str
     pages_dir = design_system_dir / "pages"
     
     created_files = []
+    changed_files = []
     
     # Create directories
     design_system_dir.mkdir(parents=True, exist_ok=True)
@@ -518,29 +699,46 @@ def persist_design_system(design_system: dict, page: str = None, output_dir: str
     
     master_file = design_system_dir / "MASTER.md"
     
-    # Generate and write MASTER.md
-    master_content = format_master_md(design_system)
-    with open(master_file, 'w', encoding='utf-8') as f:
-        f.write(master_content)
+    # Stream MASTER.md to disk, keeping it only if it changed
+    if _write_if_changed(master_file, lambda: iter_master_md(design_system)):
+        changed_files.append(str(master_file))
     created_files.append(str(master_file))
     
-    # If page is specified, create page override file with intelligent content
-    if page:
-        page_file = pages_dir / f"{page.lower().replace(' ', '-')}.md"
-        page_content = format_page_override_md(design_system, page, page_query)
-        with open(page_file, 'w', encoding='utf-8') as f:
-            f.write(page_content)
-        created_files.append(str(page_file))
+    # Page override files: searches batched per domain, pages rendered in parallel
+    # One worker per override file: names that map to the same file (repeats, case) keep their first spelling
+    page_slugs = {}
+    for name in ([page] if page else []) + [p for p in (pages or []) if p]:
+        page_slugs.setdefault(_page_slug(name), name)
+    page_names = list(page_slugs.values())
+    page_searches = _batch_override_searches(page_names, page_query)
+
+    def persist_page(page_name):
+        page_file = pages_dir / f"{_page_slug(page_name)}.md"
+        return str(page_file), _write_if_changed(
+            page_file, lambda: iter_page_override_md(design_system, page_name, page_query, page_searches[page_name]))
+
+    workers = max(1, min(MAX_PAGE_WORKERS, len(page_names)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for page_file, changed in executor.map(persist_page, page_names):
+            if changed:
+                changed_files.append(page_file)
+            created_files.append(page_file)
     
     return {
         "status": "success",
         "design_system_dir": str(design_system_dir),
-        "created_files": created_files
+        "created_files": created_files,
+        "changed_files": changed_files
     }
 
 
 def format_master_md(design_system: dict) -> str:
     """Format design system as MASTER.md with hierarchical override logic."""
+    return "\n".join(iter_master_md(design_system))
+
+
+def iter_master_md(design_system: dict) -> Iterator[str]:
+    """Render MASTER.md lines with hierarchical override logic."""
     project = design_system.get("project_name", "PROJECT")
     pattern = design_system.get("pattern", {})
     style = design_system.get("style", {})
@@ -551,388 +749,399 @@ def format_master_md(design_system: dict) -> str:
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    lines = []
     
     # Logic header
-    lines.append("# Design System Master File")
-    lines.append("")
-    lines.append("> **LOGIC:** When building a specific page, first check `design-system/pages/[page-name].md`.")
-    lines.append("> If that file exists, its rules **override** this Master file.")
-    lines.append("> If not, strictly follow the rules below.")
-    lines.append("")
-    lines.append("---")
-    lines.append("")
-    lines.append(f"**Project:** {project}")
-    lines.append(f"**Generated:** {timestamp}")
-    lines.append(f"**Category:** {design_system.get('category', 'General')}")
-    lines.append("")
-    lines.append("---")
-    lines.append("")
+    yield "# Design System Master File"
+    yield ""
+    yield "> **LOGIC:** When building a specific page, first check `design-system/pages/[page-name].md`."
+    yield "> If that file exists, its rules **override** this Master file."
+    yield "> If not, strictly follow the rules below."
+    yield ""
+    yield "---"
+    yield ""
+    yield f"**Project:** {project}"
+    yield f"**Generated:** {timestamp}"
+    yield f"**Category:** {design_system.get('category', 'General')}"
+    yield ""
+    yield "---"
+    yield ""
     
     # Global Rules section
-    lines.append("## Global Rules")
-    lines.append("")
+    yield "## Global Rules"
+    yield ""
     
     # Color Palette
-    lines.append("### Color Palette")
-    lines.append("")
-    lines.append("| Role | Hex | CSS Variable |")
-    lines.append("|------|-----|--------------|")
-    lines.append(f"| Primary | `{colors.get('primary', '#2563EB')}` | `--color-primary` |")
-    lines.append(f"| Secondary | `{colors.get('secondary', '#3B82F6')}` | `--color-secondary` |")
-    lines.append(f"| CTA/Accent | `{colors.get('cta', '#F97316')}` | `--color-cta` |")
-    lines.append(f"| Background | `{colors.get('background', '#F8FAFC')}` | `--color-background` |")
-    lines.append(f"| Text | `{colors.get('text', '#1E293B')}` | `--color-text` |")
-    lines.append("")
+    yield "### Color Palette"
+    yield ""
+    yield "| Role | Hex | CSS Variable |"
+    yield "|------|-----|--------------|"
+    yield f"| Primary | `{colors.get('primary', '#2563EB')}` | `--color-primary` |"
+    yield f"| Secondary | `{colors.get('secondary', '#3B82F6')}` | `--color-secondary` |"
+    yield f"| CTA/Accent | `{colors.get('cta', '#F97316')}` | `--color-cta` |"
+    yield f"| Background | `{colors.get('background', '#F8FAFC')}` | `--color-background` |"
+    yield f"| Text | `{colors.get('text', '#1E293B')}` | `--color-text` |"
+    yield ""
     if colors.get("notes"):
-        lines.append(f"**Color Notes:** {colors.get('notes', '')}")
-        lines.append("")
+        yield f"**Color Notes:** {colors.get('notes', '')}"
+        yield ""
     
     # Typography
-    lines.append("### Typography")
-    lines.append("")
-    lines.append(f"- **Heading Font:** {typography.get('heading', 'Inter')}")
-    lines.append(f"- **Body Font:** {typography.get('body', 'Inter')}")
+    yield "### Typography"
+    yield ""
+    yield f"- **Heading Font:** {typography.get('heading', 'Inter')}"
+    yield f"- **Body Font:** {typography.get('body', 'Inter')}"
     if typography.get("mood"):
-        lines.append(f"- **Mood:** {typography.get('mood', '')}")
+        yield f"- **Mood:** {typography.get('mood', '')}"
     if typography.get("google_fonts_url"):
-        lines.append(f"- **Google Fonts:** [{typography.get('heading', '')} + {typography.get('body', '')}]({typography.get('google_fonts_url', '')})")
-    lines.append("")
+        yield f"- **Google Fonts:** [{typography.get('heading', '')} + {typography.get('body', '')}]({typography.get('google_fonts_url', '')})"
+    yield ""
     if typography.get("css_import"):
-        lines.append("**CSS Import:**")
-        lines.append("```css")
-        lines.append(typography.get("css_import", ""))
-        lines.append("```")
-        lines.append("")
+        yield "**CSS Import:**"
+        yield "```css"
+        yield typography.get("css_import", "")
+        yield "```"
+        yield ""
     
     # Spacing Variables
-    lines.append("### Spacing Variables")
-    lines.append("")
-    lines.append("| Token | Value | Usage |")
-    lines.append("|-------|-------|-------|")
-    lines.append("| `--space-xs` | `4px` / `0.25rem` | Tight gaps |")
-    lines.append("| `--space-sm` | `8px` / `0.5rem` | Icon gaps, inline spacing |")
-    lines.append("| `--space-md` | `16px` / `1rem` | Standard padding |")
-    lines.append("| `--space-lg` | `24px` / `1.5rem` | Section padding |")
-    lines.append("| `--space-xl` | `32px` / `2rem` | Large gaps |")
-    lines.append("| `--space-2xl` | `48px` / `3rem` | Section margins |")
-    lines.append("| `--space-3xl` | `64px` / `4rem` | Hero padding |")
-    lines.append("")
+    yield "### Spacing Variables"
+    yield ""
+    yield "| Token | Value | Usage |"
+    yield "|-------|-------|-------|"
+    yield "| `--space-xs` | `4px` / `0.25rem` | Tight gaps |"
+    yield "| `--space-sm` | `8px` / `0.5rem` | Icon gaps, inline spacing |"
+    yield "| `--space-md` | `16px` / `1rem` | Standard padding |"
+    yield "| `--space-lg` | `24px` / `1.5rem` | Section padding |"
+    yield "| `--space-xl` | `32px` / `2rem` | Large gaps |"
+    yield "| `--space-2xl` | `48px` / `3rem` | Section margins |"
+    yield "| `--space-3xl` | `64px` / `4rem` | Hero padding |"
+    yield ""
     
     # Shadow Depths
-    lines.append("### Shadow Depths")
-    lines.append("")
-    lines.append("| Level | Value | Usage |")
-    lines.append("|-------|-------|-------|")
-    lines.append("| `--shadow-sm` | `0 1px 2px rgba(0,0,0,0.05)` | Subtle lift |")
-    lines.append("| `--shadow-md` | `0 4px 6px rgba(0,0,0,0.1)` | Cards, buttons |")
-    lines.append("| `--shadow-lg` | `0 10px 15px rgba(0,0,0,0.1)` | Modals, dropdowns |")
-    lines.append("| `--shadow-xl` | `0 20px 25px rgba(0,0,0,0.15)` | Hero images, featured cards |")
-    lines.append("")
+    yield "### Shadow Depths"
+    yield ""
+    yield "| Level | Value | Usage |"
+    yield "|-------|-------|-------|"
+    yield "| `--shadow-sm` | `0 1px 2px rgba(0,0,0,0.05)` | Subtle lift |"
+    yield "| `--shadow-md` | `0 4px 6px rgba(0,0,0,0.1)` | Cards, buttons |"
+    yield "| `--shadow-lg` | `0 10px 15px rgba(0,0,0,0.1)` | Modals, dropdowns |"
+    yield "| `--shadow-xl` | `0 20px 25px rgba(0,0,0,0.15)` | Hero images, featured cards |"
+    yield ""
     
     # Component Specs section
-    lines.append("---")
-    lines.append("")
-    lines.append("## Component Specs")
-    lines.append("")
+    yield "---"
+    yield ""
+    yield "## Component Specs"
+    yield ""
     
     # Buttons
-    lines.append("### Buttons")
-    lines.append("")
-    lines.append("```css")
-    lines.append("/* Primary Button */")
-    lines.append(".btn-primary {")
-    lines.append(f"  background: {colors.get('cta', '#F97316')};")
-    lines.append("  color: white;")
-    lines.append("  padding: 12px 24px;")
-    lines.append("  border-radius: 8px;")
-    lines.append("  font-weight: 600;")
-    lines.append("  transition: all 200ms ease;")
-    lines.append("  cursor: pointer;")
-    lines.append("}")
-    lines.append("")
-    lines.append(".btn-primary:hover {")
-    lines.append("  opacity: 0.9;")
-    lines.append("  transform: translateY(-1px);")
-    lines.append("}")
-    lines.append("")
-    lines.append("/* Secondary Button */")
-    lines.append(".btn-secondary {")
-    lines.append(f"  background: transparent;")
-    lines.append(f"  color: {colors.get('primary', '#2563EB')};")
-    lines.append(f"  border: 2px solid {colors.get('primary', '#2563EB')};")
-    lines.append("  padding: 12px 24px;")
-    lines.append("  border-radius: 8px;")
-    lines.append("  font-weight: 600;")
-    lines.append("  transition: all 200ms ease;")
-    lines.append("  cursor: pointer;")
-    lines.append("}")
-    lines.append("```")
-    lines.append("")
+    yield "### Buttons"
+    yield ""
+    yield "```css"
+    yield "/* Primary Button */"
+    yield ".btn-primary {"
+    yield f"  background: {colors.get('cta', '#F97316')};"
+    yield "  color: white;"
+    yield "  padding: 12px 24px;"
+    yield "  border-radius: 8px;"
+    yield "  font-weight: 600;"
+    yield "  transition: all 200ms ease;"
+    yield "  cursor: pointer;"
+    yield "}"
+    yield ""
+    yield ".btn-primary:hover {"
+    yield "  opacity: 0.9;"
+    yield "  transform: translateY(-1px);"
+    yield "}"
+    yield ""
+    yield "/* Secondary Button */"
+    yield ".btn-secondary {"
+    yield f"  background: transparent;"
+    yield f"  color: {colors.get('primary', '#2563EB')};"
+    yield f"  border: 2px solid {colors.get('primary', '#2563EB')};"
+    yield "  padding: 12px 24px;"
+    yield "  border-radius: 8px;"
+    yield "  font-weight: 600;"
+    yield "  transition: all 200ms ease;"
+    yield "  cursor: pointer;"
+    yield "}"
+    yield "```"
+    yield ""
     
     # Cards
-    lines.append("### Cards")
-    lines.append("")
-    lines.append("```css")
-    lines.append(".card {")
-    lines.append(f"  background: {colors.get('background', '#FFFFFF')};")
-    lines.append("  border-radius: 12px;")
-    lines.append("  padding: 24px;")
-    lines.append("  box-shadow: var(--shadow-md);")
-    lines.append("  transition: all 200ms ease;")
-    lines.append("  cursor: pointer;")
-    lines.append("}")
-    lines.append("")
-    lines.append(".card:hover {")
-    lines.append("  box-shadow: var(--shadow-lg);")
-    lines.append("  transform: translateY(-2px);")
-    lines.append("}")
-    lines.append("```")
-    lines.append("")
+    yield "### Cards"
+    yield ""
+    yield "```css"
+    yield ".card {"
+    yield f"  background: {colors.get('background', '#FFFFFF')};"
+    yield "  border-radius: 12px;"
+    yield "  padding: 24px;"
+    yield "  box-shadow: var(--shadow-md);"
+    yield "  transition: all 200ms ease;"
+    yield "  cursor: pointer;"
+    yield "}"
+    yield ""
+    yield ".card:hover {"
+    yield "  box-shadow: var(--shadow-lg);"
+    yield "  transform: translateY(-2px);"
+    yield "}"
+    yield "```"
+    yield ""
     
     # Inputs
-    lines.append("### Inputs")
-    lines.append("")
-    lines.append("```css")
-    lines.append(".input {")
-    lines.append("  padding: 12px 16px;")
-    lines.append("  border: 1px solid #E2E8F0;")
-    lines.append("  border-radius: 8px;")
-    lines.append("  font-size: 16px;")
-    lines.append("  transition: border-color 200ms ease;")
-    lines.append("}")
-    lines.append("")
-    lines.append(".input:focus {")
-    lines.append(f"  border-color: {colors.get('primary', '#2563EB')};")
-    lines.append("  outline: none;")
-    lines.append(f"  box-shadow: 0 0 0 3px {colors.get('primary', '#2563EB')}20;")
-    lines.append("}")
-    lines.append("```")
-    lines.append("")
+    yield "### Inputs"
+    yield ""
+    yield "```css"
+    yield ".input {"
+    yield "  padding: 12px 16px;"
+    yield "  border: 1px solid #E2E8F0;"
+    yield "  border-radius: 8px;"
+    yield "  font-size: 16px;"
+    yield "  transition: border-color 200ms ease;"
+    yield "}"
+    yield ""
+    yield ".input:focus {"
+    yield f"  border-color: {colors.get('primary', '#2563EB')};"
+    yield "  outline: none;"
+    yield f"  box-shadow: 0 0 0 3px {colors.get('primary', '#2563EB')}20;"
+    yield "}"
+    yield "```"
+    yield ""
     
     # Modals
-    lines.append("### Modals")
-    lines.append("")
-    lines.append("```css")
-    lines.append(".modal-overlay {")
-    lines.append("  background: rgba(0, 0, 0, 0.5);")
-    lines.append("  backdrop-filter: blur(4px);")
-    lines.append("}")
-    lines.append("")
-    lines.append(".modal {")
-    lines.append("  background: white;")
-    lines.append("  border-radius: 16px;")
-    lines.append("  padding: 32px;")
-    lines.append("  box-shadow: var(--shadow-xl);")
-    lines.append("  max-width: 500px;")
-    lines.append("  width: 90%;")
-    lines.append("}")
-    lines.append("```")
-    lines.append("")
+    yield "### Modals"
+    yield ""
+    yield "```css"
+    yield ".modal-overlay {"
+    yield "  background: rgba(0, 0, 0, 0.5);"
+    yield "  backdrop-filter: blur(4px);"
+    yield "}"
+    yield ""
+    yield ".modal {"
+    yield "  background: white;"
+    yield "  border-radius: 16px;"
+    yield "  padding: 32px;"
+    yield "  box-shadow: var(--shadow-xl);"
+    yield "  max-width: 500px;"
+    yield "  width: 90%;"
+    yield "}"
+    yield "```"
+    yield ""
     
     # Style section
-    lines.append("---")
-    lines.append("")
-    lines.append("## Style Guidelines")
-    lines.append("")
-    lines.append(f"**Style:** {style.get('name', 'Minimalism')}")
-    lines.append("")
+    yield "---"
+    yield ""
+    yield "## Style Guidelines"
+    yield ""
+    yield f"**Style:** {style.get('name', 'Minimalism')}"
+    yield ""
     if style.get("keywords"):
-        lines.append(f"**Keywords:** {style.get('keywords', '')}")
-        lines.append("")
+        yield f"**Keywords:** {style.get('keywords', '')}"
+        yield ""
     if style.get("best_for"):
-        lines.append(f"**Best For:** {style.get('best_for', '')}")
-        lines.append("")
+        yield f"**Best For:** {style.get('best_for', '')}"
+        yield ""
     if effects:
-        lines.append(f"**Key Effects:** {effects}")
-        lines.append("")
+        yield f"**Key Effects:** {effects}"
+        yield ""
     
     # Layout Pattern
-    lines.append("### Page Pattern")
-    lines.append("")
-    lines.append(f"**Pattern Name:** {pattern.get('name', '')}")
-    lines.append("")
+    yield "### Page Pattern"
+    yield ""
+    yield f"**Pattern Name:** {pattern.get('name', '')}"
+    yield ""
     if pattern.get('conversion'):
-        lines.append(f"- **Conversion Strategy:** {pattern.get('conversion', '')}")
+        yield f"- **Conversion Strategy:** {pattern.get('conversion', '')}"
     if pattern.get('cta_placement'):
-        lines.append(f"- **CTA Placement:** {pattern.get('cta_placement', '')}")
-    lines.append(f"- **Section Order:** {pattern.get('sections', '')}")
-    lines.append("")
+        yield f"- **CTA Placement:** {pattern.get('cta_placement', '')}"
+    yield f"- **Section Order:** {pattern.get('sections', '')}"
+    yield ""
     
     # Anti-Patterns section
-    lines.append("---")
-    lines.append("")
-    lines.append("## Anti-Patterns (Do NOT Use)")
-    lines.append("")
+    yield "---"
+    yield ""
+    yield "## Anti-Patterns (Do NOT Use)"
+    yield ""
     if anti_patterns:
         anti_list = [a.strip() for a in anti_patterns.split("+")]
         for anti in anti_list:
             if anti:
-                lines.append(f"- ❌ {anti}")
-    lines.append("")
-    lines.append("### Additional Forbidden Patterns")
-    lines.append("")
-    lines.append("- ❌ **Emojis as icons** — Use SVG icons (Heroicons, Lucide, Simple Icons)")
-    lines.append("- ❌ **Missing cursor:pointer** — All clickable elements must have cursor:pointer")
-    lines.append("- ❌ **Layout-shifting hovers** — Avoid scale transforms that shift layout")
-    lines.append("- ❌ **Low contrast text** — Maintain 4.5:1 minimum contrast ratio")
-    lines.append("- ❌ **Instant state changes** — Always use transitions (150-300ms)")
-    lines.append("- ❌ **Invisible focus states** — Focus states must be visible for a11y")
-    lines.append("")
+                yield f"- ❌ {anti}"
+    yield ""
+    yield "### Additional Forbidden Patterns"
+    yield ""
+    yield "- ❌ **Emojis as icons** — Use SVG icons (Heroicons, Lucide, Simple Icons)"
+    yield "- ❌ **Missing cursor:pointer** — All clickable elements must have cursor:pointer"
+    yield "- ❌ **Layout-shifting hovers** — Avoid scale transforms that shift layout"
+    yield "- ❌ **Low contrast text** — Maintain 4.5:1 minimum contrast ratio"
+    yield "- ❌ **Instant state changes** — Always use transitions (150-300ms)"
+    yield "- ❌ **Invisible focus states** — Focus states must be visible for a11y"
+    yield ""
     
     # Pre-Delivery Checklist
-    lines.append("---")
-    lines.append("")
-    lines.append("## Pre-Delivery Checklist")
-    lines.append("")
-    lines.append("Before delivering any UI code, verify:")
-    lines.append("")
-    lines.append("- [ ] No emojis used as icons (use SVG instead)")
-    lines.append("- [ ] All icons from consistent icon set (Heroicons/Lucide)")
-    lines.append("- [ ] `cursor-pointer` on all clickable elements")
-    lines.append("- [ ] Hover states with smooth transitions (150-300ms)")
-    lines.append("- [ ] Light mode: text contrast 4.5:1 minimum")
-    lines.append("- [ ] Focus states visible for keyboard navigation")
-    lines.append("- [ ] `prefers-reduced-motion` respected")
-    lines.append("- [ ] Responsive: 375px, 768px, 1024px, 1440px")
-    lines.append("- [ ] No content hidden behind fixed navbars")
-    lines.append("- [ ] No horizontal scroll on mobile")
-    lines.append("")
-    
-    return "\n".join(lines)
+    yield "---"
+    yield ""
+    yield "## Pre-Delivery Checklist"
+    yield ""
+    yield "Before delivering any UI code, verify:"
+    yield ""
+    yield "- [ ] No emojis used as icons (use SVG instead)"
+    yield "- [ ] All icons from consistent icon set (Heroicons/Lucide)"
+    yield "- [ ] `cursor-pointer` on all clickable elements"
+    yield "- [ ] Hover states with smooth transitions (150-300ms)"
+    yield "- [ ] Light mode: text contrast 4.5:1 minimum"
+    yield "- [ ] Focus states visible for keyboard navigation"
+    yield "- [ ] `prefers-reduced-motion` respected"
+    yield "- [ ] Responsive: 375px, 768px, 1024px, 1440px"
+    yield "- [ ] No content hidden behind fixed navbars"
+    yield "- [ ] No horizontal scroll on mobile"
+    yield ""
+
+
+def format_page_override_md(design_system: dict, page_name: str, page_query: str = None,
+                            searches: dict = None) -> str:
+    """Format a page-specific override file with intelligent AI-generated content."""
+    return "\n".join(iter_page_override_md(design_system, page_name, page_query, searches))
 
 
-def format_page_override_md(design_system: dict, page_name: str, page_query: str = None) -> str:
-    """Format a page-specific override file with intelligent AI-generated content."""
+def iter_page_override_md(design_system: dict, page_name: str, page_query: str = None,
+                          searches: dict = None) -> Iterator[str]:
+    """Render page-specific override lines with intelligent AI-generated content."""
     project = design_system.get("project_name", "PROJECT")
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     page_title = page_name.replace("-", " ").replace("_", " ").title()
     
     # Detect page type and generate intelligent overrides
-    page_overrides = _generate_intelligent_overrides(page_name, page_query, design_system)
+    page_overrides = _generate_intelligent_overrides(page_name, page_query, design_system, searches)
     
-    lines = []
     
-    lines.append(f"# {page_title} Page Overrides")
-    lines.append("")
-    lines.append(f"> **PROJECT:** {project}")
-    lines.append(f"> **Generated:** {timestamp}")
-    lines.append(f"> **Page Type:** {page_overrides.get('page_type', 'General')}")
-    lines.append("")
-    lines.append("> ⚠️ **IMPORTANT:** Rules in this file **override** the Master file (`design-system/MASTER.md`).")
-    lines.append("> Only deviations from the Master are documented here. For all other rules, refer to the Master.")
-    lines.append("")
-    lines.append("---")
-    lines.append("")
+    yield f"# {page_title} Page Overrides"
+    yield ""
+    yield f"> **PROJECT:** {project}"
+    yield f"> **Generated:** {timestamp}"
+    yield f"> **Page Type:** {page_overrides.get('page_type', 'General')}"
+    yield ""
+    yield "> ⚠️ **IMPORTANT:** Rules in this file **override** the Master file (`design-system/MASTER.md`)."
+    yield "> Only deviations from the Master are documented here. For all other rules, refer to the Master."
+    yield ""
+    yield "---"
+    yield ""
     
     # Page-specific rules with actual content
-    lines.append("## Page-Specific Rules")
-    lines.append("")
+    yield "## Page-Specific Rules"
+    yield ""
     
     # Layout Overrides
-    lines.append("### Layout Overrides")
-    lines.append("")
+    yield "### Layout Overrides"
+    yield ""
     layout = page_overrides.get("layout", {})
     if layout:
         for key, value in layout.items():
-            lines.append(f"- **{key}:** {value}")
+            yield f"- **{key}:** {value}"
     else:
-        lines.append("- No overrides — use Master layout")
-    lines.append("")
+        yield "- No overrides — use Master layout"
+    yield ""
     
     # Spacing Overrides
-    lines.append("### Spacing Overrides")
-    lines.append("")
+    yield "### Spacing Overrides"
+    yield ""
     spacing = page_overrides.get("spacing", {})
     if spacing:
         for key, value in spacing.items():
-            lines.append(f"- **{key}:** {value}")
+            yield f"- **{key}:** {value}"
     else:
-        lines.append("- No overrides — use Master spacing")
-    lines.append("")
+        yield "- No overrides — use Master spacing"
+    yield ""
     
     # Typography Overrides
-    lines.append("### Typography Overrides")
-    lines.append("")
+    yield "### Typography Overrides"
+    yield ""
     typography = page_overrides.get("typography", {})
     if typography:
         for key, value in typography.items():
-            lines.append(f"- **{key}:** {value}")
+            yield f"- **{key}:** {value}"
     else:
-        lines.append("- No overrides — use Master typography")
-    lines.append("")
+        yield "- No overrides — use Master typography"
+    yield ""
     
     # Color Overrides
-    lines.append("### Color Overrides")
-    lines.append("")
+    yield "### Color Overrides"
+    yield ""
     colors = page_overrides.get("colors", {})
     if colors:
         for key, value in colors.items():
-            lines.append(f"- **{key}:** {value}")
+            yield f"- **{key}:** {value}"
     else:
-        lines.append("- No overrides — use Master colors")
-    lines.append("")
+        yield "- No overrides — use Master colors"
+    yield ""
     
     # Component Overrides
-    lines.append("### Component Overrides")
-    lines.append("")
+    yield "### Component Overrides"
+    yield ""
     components = page_overrides.get("components", [])
     if components:
         for comp in components:
-            lines.append(f"- {comp}")
+            yield f"- {comp}"
     else:
-        lines.append("- No overrides — use Master component specs")
-    lines.append("")
+        yield "- No overrides — use Master component specs"
+    yield ""
     
     # Page-Specific Components
-    lines.append("---")
-    lines.append("")
-    lines.append("## Page-Specific Components")
-    lines.append("")
+    yield "---"
+    yield ""
+    yield "## Page-Specific Components"
+    yield ""
     unique_components = page_overrides.get("unique_components", [])
     if unique_components:
         for comp in unique_components:
-            lines.append(f"- {comp}")
+            yield f"- {comp}"
     else:
-        lines.append("- No unique components for this page")
-    lines.append("")
+        yield "- No unique components for this page"
+    yield ""
     
     # Recommendations
-    lines.append("---")
-    lines.append("")
-    lines.append("## Recommendations")
-    lines.append("")
+    yield "---"
+    yield ""
+    yield "## Recommendations"
+    yield ""
     recommendations = page_overrides.get("recommendations", [])
     if recommendations:
         for rec in recommendations:
-            lines.append(f"- {rec}")
-    lines.append("")
-    
-    return "\n".join(lines)
+            yield f"- {rec}"
+    yield ""
+
 
+def _override_context(page_name: str, page_query: str = None) -> str:
+    """Search context for a page: its name plus the originating query."""
+    return f"{page_name.lower()} {(page_query or '').lower()}"
 
-def _generate_intelligent_overrides(page_name: str, page_query: str, design_system: dict) -> dict:
+
+def _batch_override_searches(page_names: list, page_query: str = None) -> dict:
+    """Run every page's override searches, one batch per domain: {page: {domain: result}}."""
+    contexts = [_override_context(name, page_query) for name in page_names]
+    searches = {name: {} for name in page_names}
+    for domain, max_results in OVERRIDE_SEARCH_CONFIG.items():
+        for name, result in zip(page_names, search_many(contexts, domain, max_results)):
+            searches[name][domain] = result
+    return searches
+
+
+def _generate_intelligent_overrides(page_name: str, page_query: str, design_system: dict,
+                                    searches: dict = None) -> dict:
     """
     Generate intelligent overrides based on page type using layered search.
     
     Uses the existing search infrastructure to find relevant style, UX, and layout
-    data instead of hardcoded page types.
+    data instead of hardcoded page types. Pass searches (from _batch_override_searches)
+    to reuse results fetched for several pages at once.
     """
-    from core import search
-    
-    page_lower = page_name.lower()
-    query_lower = (page_query or "").lower()
-    combined_context = f"{page_lower} {query_lower}"
-    
-    # Search across multiple domains for page-specific guidance
-    style_search = search(combined_context, "style", max_results=1)
-    ux_search = search(combined_context, "ux", max_results=3)
-    landing_search = search(combined_context, "landing", max_results=1)
+    combined_context = _override_context(page_name, page_query)
+    if searches is None:
+        searches = _batch_override_searches([page_name], page_query)[page_name]
     
     # Extract results from search response
-    style_results = style_search.get("results", [])
-    ux_results = ux_search.get("results", [])
-    landing_results = landing_search.get("results", [])
+    style_results = searches["style"].get("results", [])
+    ux_results = searches["ux"].get("results", [])
+    landing_results = searches["landing"].get("results", [])
     
     # Detect page type from search results or context
     page_type = _detect_page_type(combined_context, style_results)
@@ -1019,24 +1228,9 @@ def _generate_intelligent_overrides(page_name: str, page_query: str, design_syst
 
 def _detect_page_type(context: str, style_results: list) -> str:
     """Detect page type from context and search results."""
-    context_lower = context.lower()
-    
-    # Check for common page type patterns
-    page_patterns = [
-        (["dashboard", "admin", "analytics", "data", "metrics", "stats", "monitor", "overview"], "Dashboard / Data View"),
-        (["checkout", "payment", "cart", "purchase", "order", "billing"], "Checkout / Payment"),
-        (["settings", "profile", "account", "preferences", "config"], "Settings / Profile"),
-        (["landing", "marketing", "homepage", "hero", "home", "promo"], "Landing / Marketing"),
-        (["login", "signin", "signup", "register", "auth", "password"], "Authentication"),
-        (["pricing", "plans", "subscription", "tiers", "packages"], "Pricing / Plans"),
-        (["blog", "article", "post", "news", "content", "story"], "Blog / Article"),
-        (["product", "item", "detail", "pdp", "shop", "store"], "Product Detail"),
-        (["search", "results", "browse", "filter", "catalog", "list"], "Search Results"),
-        (["empty", "404", "error", "not found", "zero"], "Empty State"),
-    ]
-    
-    for keywords, page_type in page_patterns:
-        if any(kw in context_lower for kw in keywords):
+    page_counts = _PAGE_MATCHER.counts(context.lower())
+    for page_type, count in page_counts.items():
+        if count:
             return page_type
     
     # Fallback: try to infer from style results
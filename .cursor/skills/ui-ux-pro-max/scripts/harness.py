@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UI/UX Pro Max Harness - differential equivalence and relevance checks for search backends
+Usage: python harness.py [--queries 50] [--seed 0] [--top-k 5] [--backend lexical,cached]
+
+Every CSV_CONFIG / STACK_CONFIG file is indexed by ReferenceBM25 (the original
+list-scanning implementation and tokenizer, kept verbatim as the source of truth),
+by ReferenceBM25 fed the production Analyzer, and by each backend. Randomized and
+corpus-derived queries are run against all of them and the report lists:
+  mismatches   Queries whose top-k differs from the row's oracle (tie-only: the
+               differing documents have oracle scores within SCORE_TOLERANCE)
+  score delta  Largest |backend - oracle| score over shared hits
+  nDCG@k       Against the hand-labelled LABELLED_QUERIES
+  latency      Mean time per query
+The "analyzer" row compares analyzed ranking against the original tokenizer, so
+analyzer changes show up as explicit mismatches and an nDCG difference. Backends are
+compared against the analyzed reference (same terms, so only the engine differs).
+The analyzer check runs ANALYZER_CASES through get_analyzer() and lists every
+case whose terms differ from the expected ones.
+The recall check asserts that hybrid ranking keeps every lexical hit on RECALL_QUERIES,
+for search() and per stack for search_stacks().
+The routing check scores both domain routers (detect_domain and route_domains)
+against the hand-labelled LABELLED_ROUTES.
+"""
+
+import argparse
+import random
+import re
+import time
+from collections import defaultdict
+from math import log, log2
+import core
+from core import CSV_CONFIG, STACK_CONFIG, _STACK_COLS, _get_index, load_data, search, search_stack, search_stacks
+
+SCORE_TOLERANCE = 1e-3  # Relative to the top reference score; covers impact quantization
+
+# Graded judgments (3 = best match) keyed by the first "key" column of each domain
+LABELLED_QUERIES = [
+    ("style", "frosted glass transparent blur", {"Glassmorphism": 3, "Liquid Glass": 2, "Aurora UI": 1}),
+    ("style", "dark theme oled", {"Dark Mode (OLED)": 3, "Cyberpunk UI": 1}),
+    ("style", "soft extruded shadows", {"Neumorphism": 3, "Soft UI Evolution": 2, "Claymorphism": 1}),
+    ("style", "kpi executive overview", {"Executive Dashboard": 3, "Data-Dense Dashboard": 1, "Financial Dashboard": 1}),
+    ("product", "crypto wallet trading", {"Fintech/Crypto": 3, "NFT/Web3 Platform": 2, "Banking/Traditional Finance": 1}),
+    ("product", "hospital patient appointments", {"Healthcare App": 3, "Mental Health App": 1, "Senior Care/Elderly": 1}),
+    ("product", "online store luxury", {"E-commerce Luxury": 3, "E-commerce": 2, "Luxury/Premium Brand": 2}),
+    ("typography", "elegant serif luxury", {"Luxury Serif": 3, "Classic Elegant": 2, "Real Estate Luxury": 1, "Luxury Minimalist": 1}),
+    ("typography", "code developer monospace", {"Developer Mono": 3, "Tech/HUD Mono": 2}),
+    ("chart", "sales over time trend", {"Trend Over Time": 3, "Time-Series Forecast": 2, "Cumulative Changes": 1}),
+    ("chart", "conversion funnel stages", {"Funnel/Flow": 3, "Flow/Process Data": 1}),
+    ("landing", "pricing plans tiers", {"Pricing Page + CTA": 3, "Pricing-Focused Landing": 3, "Comparison Table + CTA": 1}),
+    ("landing", "waitlist launch coming soon", {"Waitlist/Coming Soon": 3}),
+]
+
+# Expected domain for queries without --domain
+LABELLED_ROUTES = [
+    ("glassmorphism dark", "style"), ("brutalism", "style"), ("neumorphism soft shadows", "style"),
+    ("minimalism swiss", "style"), ("claymorphism playful", "style"), ("aurora gradient style", "style"),
+    ("healthcare app", "product"), ("fintech app", "product"), ("ecommerce luxury store", "product"),
+    ("crypto exchange", "product"), ("fitness tracker app", "product"), ("saas dashboard", "product"),
+    ("blue palette", "color"), ("brand color palette", "color"), ("hex colors for fintech", "color"),
+    ("bar chart comparison", "chart"), ("time series trend", "chart"), ("heatmap", "chart"),
+    ("funnel visualization", "chart"),
+    ("hero pricing cta", "landing"), ("testimonials social proof", "landing"), ("waitlist landing page", "landing"),
+    ("touch target size", "ux"), ("scroll performance", "ux"), ("keyboard navigation", "ux"),
+    ("loading states", "ux"),
+    ("elegant serif font", "typography"), ("monospace developer font", "typography"),
+    ("playful rounded heading font", "typography"),
+    ("lucide arrow icon", "icons"), ("trash delete icon", "icons"), ("settings gear icon", "icons"),
+    ("useEffect rerender", "react"), ("bundle barrel imports", "react"), ("suspense waterfall", "react"),
+    ("aria labels focus", "web"), ("form input autocomplete", "web"), ("preconnect fonts", "web"),
+]
+
+# Expected query terms per analyzer: (ANALYZER_CONFIG domain, text, terms); independent of both rankers
+ANALYZER_CASES = [
+    ("style", "Animations and Galleries", ("animation", "gallery")),
+    ("style", "UI for the AI dashboard", ("ui", "ai", "dashboard")),
+    ("product", "ecommerce store", ("ecommerce", "store", "commerce", "shop")),
+    ("color", "colour grey", ("colour", "grey", "color", "gray")),
+    ("chart", "3d bar charts vs pie", ("3d", "bar", "chart", "pie")),
+    ("landing", "CTA buttons", ("cta", "button")),
+    ("ux", "a11y focus states", ("a11y", "focus", "state", "accessibility")),
+    ("typography", "Noto Serif JP", ("noto", "serif", "jp")),
+    ("icons", "close trash", ("close", "trash", "x", "delete")),
+    ("stacks", "useEffect hooks", ("useeffect", "hook")),
+]
+
+# Broad queries with more lexical hits than LSA_CANDIDATES: (domain, query, max_results)
+RECALL_QUERIES = [
+    ("ux", "accessibility mobile touch keyboard screen", 60),
+    ("style", "dark light modern clean minimal", 60),
+    ("product", "app platform service dashboard", 60),
+    ("stacks", "responsive layout images", 3),
+    ("stacks", "state performance render", 5),
+]
+
+
+# ============ REFERENCE IMPLEMENTATION ============
+class ReferenceBM25:
+    """BM25 ranking algorithm for text search (original implementation; do not optimize).
+
+    Without an analyzer it tokenizes exactly as the original code did and is the
+    independent oracle. analyzer, when given, replaces the tokenizer (documents
+    via analyze(), queries via query()) so backends are compared on equal terms.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, analyzer=None):
+        self.k1 = k1
+        self.b = b
+        self.analyzer = analyzer
+        self.corpus = []
+        self.doc_lengths = []
+        self.avgdl = 0
+        self.idf = {}
+        self.doc_freqs = defaultdict(int)
+        self.N = 0
+
+    def tokenize(self, text):
+        """Lowercase, split, remove punctuation, filter short words (original tokenizer; do not change)"""
+        if self.analyzer is not None:
+            return self.analyzer.analyze(text)
+        text = re.sub(r'[^\w\s]', ' ', str(text).lower())
+        return [w for w in text.split() if len(w) > 2]
+
+    def fit(self, documents):
+        """Build BM25 index from documents"""
+        self.corpus = [self.tokenize(doc) for doc in documents]
+        self.N = len(self.corpus)
+        if self.N == 0:
+            return
+        self.doc_lengths = [len(doc) for doc in self.corpus]
+        self.avgdl = sum(self.doc_lengths) / self.N
+
+        for doc in self.corpus:
+            seen = set()
+            for word in doc:
+                if word not in seen:
+                    self.doc_freqs[word] += 1
+                    seen.add(word)
+
+        for word, freq in self.doc_freqs.items():
+            self.idf[word] = log((self.N - freq + 0.5) / (freq + 0.5) + 1)
+
+    def score(self, query):
+        """Score all documents against query"""
+        query_tokens = self.analyzer.query(query) if self.analyzer is not None else self.tokenize(query)
+        scores = []
+
+        for idx, doc in enumerate(self.corpus):
+            score = 0
+            doc_len = self.doc_lengths[idx]
+            term_freqs = defaultdict(int)
+            for word in doc:
+                term_freqs[word] += 1
+
+            for token in query_tokens:
+                if token in self.idf:
+                    tf = term_freqs[token]
+                    idf = self.idf[token]
+                    numerator = tf * (self.k1 + 1)
+                    denominator = tf + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)
+                    score += idf * numerator / denominator
+
+            scores.append((idx, score))
+
+        return sorted(scores, key=lambda x: x[1], reverse=True)
+
+
+# ============ CORPORA AND QUERIES ============
+def _specs():
+    """One spec per configured file: where to search and how to call the public API"""
+    specs = [{"name": domain, "file": c["file"], "search_cols": c["search_cols"], "output_cols": c["output_cols"],
+              "key": c["key"][0], "call": lambda q, k, d=domain: search(q, d, k)}
+             for domain, c in CSV_CONFIG.items()]
+    specs += [{"name": f"stack:{stack}", "file": c["file"], "search_cols": _STACK_COLS["search_cols"],
+               "output_cols": _STACK_COLS["output_cols"], "key": _STACK_COLS["key"][1],
+               "call": lambda q, k, s=stack: search_stack(q, s, k)}
+              for stack, c in STACK_CONFIG.items()]
+    for spec in specs:
+        spec["rows"] = load_data(spec["file"])
+        spec["documents"] = [" ".join(str(row.get(col, "")) for col in spec["search_cols"]) for row in spec["rows"]]
+        spec["reference"] = ReferenceBM25()
+        spec["reference"].fit(spec["documents"])
+        spec["analyzed"] = ReferenceBM25(analyzer=_get_index(spec["file"], spec["search_cols"]).bm25.analyzer)
+        spec["analyzed"].fit(spec["documents"])
+    return [spec for spec in specs if spec["rows"]]
+
+
+def _queries(spec, count, rng):
+    """Half corpus-derived (a token window from a real row), half random vocabulary/noise mixes"""
+    reference = spec["reference"]
+    vocabulary = sorted(reference.idf)
+    queries = []
+    for i in range(count):
+        if i % 2 == 0:
+            tokens = reference.corpus[rng.randrange(reference.N)] or ["empty"]
+            start = rng.randrange(len(tokens))
+            queries.append(" ".join(tokens[start:start + rng.randint(1, 4)]))
+        else:
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 3))]
+            if rng.random() < 0.3:
+                words.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6)))
+            rng.shuffle(words)
+            queries.append(" ".join(words))
+    return queries
+
+
+# ============ BACKENDS ============
+def _lexical(spec, query, k):
+    return _get_index(spec["file"], spec["search_cols"]).rank(query)
+
+
+def _fuzzy(spec, query, k):
+    return _get_index(spec["file"], spec["search_cols"]).rank(query, fuzzy=True)
+
+
+def _hybrid(spec, query, k):
+    return _get_index(spec["file"], spec["search_cols"]).rank(query, hybrid=True)
+
+
+def _cached(spec, query, k):
+    """Public API twice, so the second call is served by the result cache; rows mapped back to ids"""
+    spec["call"](query, k)
+    index = _get_index(spec["file"], spec["search_cols"])
+    if "positions" not in spec:
+        spec["positions"] = {tuple(index.project(i, spec["output_cols"]).items()): i for i in range(len(index.data))}
+    return [(spec["positions"][tuple(row.items())], None) for row in spec["call"](query, k)["results"]]
+
+
+def _analyzed(spec, query, k):
+    return spec["analyzed"].score(query)
+
+
+# name -> (rank function, scores comparable to BM25)
+BACKENDS = {
+    "lexical": (_lexical, True),
+    "fuzzy": (_fuzzy, True),
+    "hybrid": (_hybrid, False),
+    "cached": (_cached, False),
+}
+
+
+# ============ METRICS ============
+def _top(ranked, k):
+    return [(idx, score) for idx, score in ranked[:k] if score is None or score > 0]
+
+
+def _compare(reference, candidate, k):
+    """(mismatch, tie_only, max score delta) of candidate's top-k against the reference ranking"""
+    ref_top = _top(reference, k)
+    ref_ids = [idx for idx, _ in ref_top]
+    ids = [idx for idx, _ in _top(candidate, k)]
+    ref_scores = dict(reference)
+    delta = max((abs(score - ref_scores[idx]) for idx, score in candidate[:k] if score is not None), default=0.0)
+    if ids == ref_ids:
+        return False, False, delta
+    tolerance = SCORE_TOLERANCE * (ref_top[0][1] if ref_top else 1)
+    differing = {idx for a, b in zip(ids, ref_ids) if a != b for idx in (a, b)} | set(ids) ^ set(ref_ids)
+    scores = [ref_scores.get(idx, 0.0) for idx in differing]
+    tie_only = len(ids) == len(ref_ids) and max(scores) - min(scores) <= tolerance
+    return True, tie_only, delta
+
+
+def _ndcg(ranked, spec, labels, k):
+    gains = [labels.get(spec["rows"][idx].get(spec["key"], ""), 0) for idx, _ in _top(ranked, k)]
+    dcg = sum((2 ** g - 1) / log2(i + 2) for i, g in enumerate(gains))
+    ideal = sum((2 ** g - 1) / log2(i + 2) for i, g in enumerate(sorted(labels.values(), reverse=True)[:k]))
+    return dcg / ideal if ideal else 0.0
+
+
+def run(backends, queries_per_file=50, seed=0, k=5):
+    """Run the analyzed reference and every backend over every file; returns {name: stats}"""
+    rng = random.Random(seed)
+    specs = _specs()
+    by_name = {spec["name"]: spec for spec in specs}
+    workload = [(spec, query) for spec in specs for query in _queries(spec, queries_per_file, rng)]
+    oracles = {
+        "reference": [spec["reference"].score(query) for spec, query in workload],
+        "analyzer": [spec["analyzed"].score(query) for spec, query in workload],
+    }
+    core._RESULT_CACHE.clear()
+
+    report = {}
+    for name in ["reference", "analyzer"] + backends:
+        oracle = "reference" if name in ("reference", "analyzer") else "analyzer"
+        stats = {"queries": len(workload), "mismatches": 0, "tie_only": 0, "max_delta": 0.0, "samples": [],
+                 "oracle": oracle if name != "reference" else "-"}
+        if name == "reference":
+            rank = lambda spec, query, _: spec["reference"].score(query)
+        else:
+            rank = _analyzed if name == "analyzer" else BACKENDS[name][0]
+        for spec, query in workload[::queries_per_file]:  # Build each file's indexes outside the timed loop
+            rank(spec, query, k)
+        start = time.perf_counter()
+        rankings = [rank(spec, query, k) for spec, query in workload]
+        stats["latency_us"] = (time.perf_counter() - start) / len(workload) * 1e6
+        for (spec, query), reference, ranking in zip(workload, oracles[oracle], rankings):
+            mismatch, tie_only, delta = _compare(reference, ranking, k)
+            stats["max_delta"] = max(stats["max_delta"], delta)
+            if mismatch:
+                stats["mismatches"] += 1
+                stats["tie_only"] += tie_only
+                if not tie_only and len(stats["samples"]) < 3:
+                    stats["samples"].append(f"{spec['name']}: {query!r}")
+        stats["ndcg"] = sum(_ndcg(rank(by_name[domain], query, k), by_name[domain], labels, k)
+                            for domain, query, labels in LABELLED_QUERIES) / len(LABELLED_QUERIES)
+        stats["scores_comparable"] = name == "reference" or (name != "analyzer" and BACKENDS[name][1])
+        report[name] = stats
+    return report
+
+
+def format_report(report, k):
+    lines = [f"## Search backend equivalence (top-{k})", "",
+             f"| Backend | Against | Queries | Mismatches | Tie-only | Max score delta | nDCG@{k} | Latency |",
+             "|---------|---------|---------|------------|----------|-----------------|---------|---------|"]
+    for name, s in report.items():
+        delta = f"{s['max_delta']:.2e}" if s["scores_comparable"] else "n/a"
+        lines.append(f"| {name} | {s['oracle']} | {s['queries']} | {s['mismatches']} | {s['tie_only']} | {delta} | "
+                     f"{s['ndcg']:.3f} | {s['latency_us']:.1f} us |")
+    for name, s in report.items():
+        for sample in s["samples"]:
+            lines.append(f"- {name} mismatch: {sample}")
+    return "\n".join(lines)
+
+
+def analyzer_report():
+    """ANALYZER_CASES whose query terms differ from the expected ones"""
+    failures = [f"- {domain}: {text!r} -> {terms} (expected {expected})"
+                for domain, text, expected in ANALYZER_CASES
+                for terms in [tuple(core.get_analyzer(domain).query(text))] if terms != expected]
+    passed = len(ANALYZER_CASES) - len(failures)
+    return "\n".join(["## Analyzer cases", "", f"- {passed}/{len(ANALYZER_CASES)} match"] + failures)
+
+
+def recall_report():
+    """Rows returned lexically vs with hybrid=True on RECALL_QUERIES; hybrid must lose none (per stack for "stacks")"""
+    lines = ["## Hybrid recall", "", "| Query | Lexical | Hybrid | Lost |", "|-------|---------|--------|------|"]
+    for domain, query, limit in RECALL_QUERIES:
+        if domain == "stacks":  # Fusion may reorder within a stack, but no stack may come back shorter
+            lexical, hybrid = (search_stacks(query, max_results=limit, hybrid=h)["results"] for h in (False, True))
+            lost = sum(max(0, len(rows) - len(hybrid[stack])) for stack, rows in lexical.items())
+            lexical, hybrid = (sum(map(len, r.values())) for r in (lexical, hybrid))
+        else:
+            lexical, hybrid = (search(query, domain, limit, hybrid=h)["results"] for h in (False, True))
+            lost = sum(row not in hybrid for row in lexical)
+            lexical, hybrid = len(lexical), len(hybrid)
+        lines.append(f"| {domain}: {query!r} | {lexical} | {hybrid} | {lost} |")
+    return "\n".join(lines)
+
+
+def routing_report():
+    """Accuracy of the keyword and index routers on LABELLED_ROUTES, with their misroutes"""
+    routers = {
+        "keyword": core.detect_domain,
+        "index": lambda query: next(iter(core.route_domains(query, 1)), ("style", 0))[0],
+    }
+    lines = ["## Domain routing", "", "| Router | Correct | Accuracy |", "|--------|---------|----------|"]
+    misroutes = []
+    for name, route in routers.items():
+        wrong = [(query, expected, route(query)) for query, expected in LABELLED_ROUTES if route(query) != expected]
+        correct = len(LABELLED_ROUTES) - len(wrong)
+        lines.append(f"| {name} | {correct}/{len(LABELLED_ROUTES)} | {correct / len(LABELLED_ROUTES):.0%} |")
+        misroutes += [f"- {name} misroute: {query!r} -> {got} (expected {expected})" for query, expected, got in wrong]
+    return "\n".join(lines + misroutes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UI Pro Max Backend Harness")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per data file (default: 50)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--top-k", type=int, default=5, help="Ranks compared and scored (default: 5)")
+    parser.add_argument("--backend", default=",".join(BACKENDS), help=f"Comma list of {', '.join(BACKENDS)}")
+    args = parser.parse_args()
+
+    names = [b.strip() for b in args.backend.split(",") if b.strip()]
+    unknown = [b for b in names if b not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend: {', '.join(unknown)}")
+    if "hybrid" in names and core._load_numpy() is None:
+        print("NumPy not installed: hybrid backend runs lexical only")
+    print(format_report(run(names, args.queries, args.seed, args.top_k), args.top_k))
+    print("")
+    print(analyzer_report())
+    print("")
+    print(recall_report())
+    print("")
+    print(routing_report())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UI/UX Pro Max Replay - re-issue a captured query log against the in-process API
+Usage: python replay.py <log.ndjson> [--concurrency 4] [--rate 0] [--repeat 1] [--limit N]
+       python replay.py <log.ndjson> --warm-up [--top 100] [--warm-only]
+
+Capture a log by setting UIPRO_QUERY_LOG=/path/to/log.ndjson (or core.set_query_log)
+while running search.py or calling search() / search_stack() / generate_design_system().
+
+Options:
+  --concurrency  Worker threads issuing calls
+  --rate         Target calls per second across all workers (0 = as fast as possible)
+  --repeat       Replay the log N times
+  --warm-up      First load every index in parallel and precompute the --top most
+                 frequent logged calls into the result caches (warm_up() at server startup)
+  --warm-only    Warm up, report completion and exit
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import core
+from design_system import generate_design_system
+
+OPERATIONS = {
+    "search": core.search,
+    "search_stack": core.search_stack,
+    "search_stacks": core.search_stacks,
+    "design_system": generate_design_system,
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_log(path, limit=None):
+    """Replayable entries from an NDJSON query log; unknown or malformed lines are skipped"""
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("op") in OPERATIONS and isinstance(entry.get("args"), dict):
+                entries.append(entry)
+                if limit and len(entries) >= limit:
+                    break
+    return entries
+
+
+def _call(entry):
+    """Issue one logged call and return its latency in ms"""
+    args = dict(entry["args"])
+    if entry["op"] == "design_system":
+        args["persist"] = False  # Replay must not write design-system files
+        args.pop("stream", None)  # Logged as its repr; replay only needs the return value
+    started = time.perf_counter()
+    OPERATIONS[entry["op"]](**args)
+    return (time.perf_counter() - started) * 1000
+
+
+def warm_up(log_path=None, top_n=100, concurrency=4):
+    """Load every index, then issue the top_n most frequent logged calls to fill the result caches.
+
+    Call at process startup and switch traffic over once it returns.
+    Returns (indexes loaded, calls precomputed, seconds).
+    """
+    started = time.perf_counter()
+    indexes = core.load_indexes()
+    calls = []
+    if log_path:
+        calls = [{"op": op, "args": args} for op, args in core.top_queries(log_path, top_n) if op in OPERATIONS]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(_call, calls))
+    return len(indexes), len(calls), time.perf_counter() - started
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def replay(entries, concurrency=4, rate=0, repeat=1):
+    """Replay entries; returns latencies (ms), errors and wall time (s)"""
+    schedule = entries * repeat
+    interval = 1 / rate if rate > 0 else 0
+    lock = threading.Lock()
+    errors = []
+    start = time.perf_counter()
+
+    def issue(item):
+        position, entry = item
+        if interval:  # Open-loop pacing: call i starts no earlier than start + i / rate
+            delay = start + position * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            return _call(entry)
+        except Exception as e:  # Keep replaying; report failures at the end
+            with lock:
+                errors.append(f"{entry['op']}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [ms for ms in executor.map(issue, enumerate(schedule)) if ms is not None]
+    return latencies, errors, time.perf_counter() - start
+
+
+def format_report(latencies, errors, elapsed, concurrency, rate):
+    """Markdown summary of a replay run"""
+    ordered = sorted(latencies)
+    lines = [
+        "## Replay",
+        f"**Calls:** {len(latencies) + len(errors)} | **Errors:** {len(errors)} | "
+        f"**Concurrency:** {concurrency} | **Rate:** {rate or 'unlimited'}",
+        "",
+        f"- throughput: {len(latencies) / elapsed if elapsed else 0:.1f} calls/s over {elapsed:.2f} s",
+    ]
+    lines += [f"- p{pct}: {_percentile(ordered, pct):.3f} ms" for pct in PERCENTILES]
+    lines.append(f"- max: {ordered[-1] if ordered else 0:.3f} ms")
+    lines += [f"- error: {e}" for e in errors[:5]]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UI Pro Max Query Log Replay")
+    parser.add_argument("log", help="NDJSON query log captured with UIPRO_QUERY_LOG")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="Worker threads (default: 4)")
+    parser.add_argument("--rate", type=float, default=0, help="Calls per second, 0 = unlimited (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the log N times (default: 1)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N entries")
+    parser.add_argument("--warm-up", action="store_true", help="Load indexes and precompute top logged calls first")
+    parser.add_argument("--top", type=int, default=100, help="Calls precomputed by --warm-up (default: 100)")
+    parser.add_argument("--warm-only", action="store_true", help="Warm up, report and exit")
+    args = parser.parse_args()
+
+    core.set_query_log(None)  # Don't append the replayed calls to a log
+    if args.warm_up or args.warm_only:
+        loaded, precomputed, seconds = warm_up(args.log, args.top, args.concurrency)
+        print(f"Warm-up complete: {loaded} indexes loaded, {precomputed} calls precomputed in {seconds:.2f} s")
+        if args.warm_only:
+            sys.exit(0)
+    entries = load_log(args.log, args.limit)
+    if not entries:
+        print(f"No replayable entries in {args.log}", file=sys.stderr)
+        sys.exit(1)
+    latencies, errors, elapsed = replay(entries, args.concurrency, args.rate, args.repeat)
+    print(format_report(latencies, errors, elapsed, args.concurrency, args.rate))
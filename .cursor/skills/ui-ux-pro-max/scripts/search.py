@@ -2,22 +2,45 @@
 # -*- coding: utf-8 -*-
 """
 UI/UX Pro Max Search - BM25 search engine for UI/UX style guides
-Usage: python search.py "<query>" [--domain <domain>] [--stack <stack>] [--max-results 3]
+Usage: python search.py "<query>" [--domain <domain>] [--stack <stack>] [--max-results 3] [--fuzzy] [--hybrid]
+       python search.py "<query>" --domain style --explain
+       python search.py '"dark mode" contrast' --domain style  (quoted phrase; "dark oled"~3 = proximity)
+       python search.py "<query>" --domain ux --filter Severity=High --filter Platform=Web,All
+       python search.py "<prefix>" --suggest [--domain icons|typography|style]
+       python search.py "#1E40AF" --domain color          (nearest palettes by OKLab distance)
+       python search.py "<query>" --stack all            (or --stack react,vue,svelte)
+       python search.py "<query>" --route index
+       python search.py "<query>" --fields "Style Category,Keywords" --ndjson --max-chars 2000
        python search.py "<query>" --design-system [-p "Project Name"]
        python search.py "<query>" --design-system --persist [-p "Project Name"] [--page "dashboard"]
+       python search.py "<query>" --design-system --persist [-p "Project Name"] --pages home,pricing,dashboard
 
 Domains: style, prompt, color, chart, landing, product, ux, typography
 Stacks: html-tailwind, react, nextjs
 
+Routing:
+  --route index  Pick the domain by scoring the query against every domain's data
+                 (default "keyword" uses the hand-written keyword table)
+
 Persistence (Master + Overrides pattern):
   --persist    Save design system to design-system/MASTER.md
   --page       Also create a page-specific override file in design-system/pages/
+  --pages      Create override files for several pages in one run (master generated once)
+
+Data overlays:
+  Set UIPRO_DATA_DIRS=org_dir:project_dir to layer extra data directories over the bundled
+  data/ (same file names; rows with the same key columns override bundled rows)
+
+Query log:
+  Set UIPRO_QUERY_LOG=/path/to/log.ndjson to record each call (timing, domain, count,
+  cache status); replay it with replay.py
 """
 
 import argparse
+import json
 import sys
 import io
-from core import CSV_CONFIG, AVAILABLE_STACKS, MAX_RESULTS, search, search_stack
+from core import CSV_CONFIG, MAX_RESULTS, search, search_stack, search_stacks, suggest
 from design_system import generate_design_system, persist_design_system
 
 # Force UTF-8 for stdout/stderr to handle emojis on Windows (cp1252 default)
@@ -27,61 +50,214 @@ if sys.stderr.encoding and sys.stderr.encoding.lower() != 'utf-8':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 
-def format_output(result):
-    """Format results for Claude consumption (token-optimized)"""
+MAX_VALUE_CHARS = 300
+TRUNCATION_MARK = "..."
+
+
+def _iter_output(result):
+    """Yield markdown output lines lazily, so rows past the budget are never rendered"""
     if "error" in result:
-        return f"Error: {result['error']}"
+        yield f"Error: {result['error']}"
+        return
 
-    output = []
     if result.get("stack"):
-        output.append(f"## UI Pro Max Stack Guidelines")
-        output.append(f"**Stack:** {result['stack']} | **Query:** {result['query']}")
+        yield f"## UI Pro Max Stack Guidelines"
+        yield f"**Stack:** {result['stack']} | **Query:** {result['query']}"
     else:
-        output.append(f"## UI Pro Max Search Results")
-        output.append(f"**Domain:** {result['domain']} | **Query:** {result['query']}")
-    output.append(f"**Source:** {result['file']} | **Found:** {result['count']} results\n")
+        yield f"## UI Pro Max Search Results"
+        yield f"**Domain:** {result['domain']} | **Query:** {result['query']}"
+        if result.get("routing"):
+            routes = ", ".join(f"{r['domain']} ({r['confidence']:.2f})" for r in result["routing"])
+            yield f"**Routing:** {routes}"
+    explain = result.get("explain")
+    if explain and explain.get("unavailable"):
+        yield f"**Explain:** unavailable ({explain['unavailable']})"
+        explain = None
+    if explain:
+        yield (f"**Explain:** terms {', '.join(explain['terms']) or '-'} | {explain['postings_visited']} postings, "
+               f"{explain['documents_scored']} documents scored in {explain['ms']:.3f} ms | "
+               f"k1={explain['k1']} b={explain['b']} avgdl={explain['avgdl']}"
+               + (" | scores fused with LSA (rrf)" if explain.get("fusion") else ""))
+    yield f"**Source:** {result['file']} | **Found:** {result['count']} results\n"
 
     for i, row in enumerate(result['results'], 1):
-        output.append(f"### Result {i}")
+        yield f"### Result {i}"
         for key, value in row.items():
             value_str = str(value)
-            if len(value_str) > 300:
-                value_str = value_str[:300] + "..."
-            output.append(f"- **{key}:** {value_str}")
-        output.append("")
+            if len(value_str) > MAX_VALUE_CHARS:
+                value_str = value_str[:MAX_VALUE_CHARS] + TRUNCATION_MARK
+            yield f"- **{key}:** {value_str}"
+        if explain:
+            yield f"- **Explain:** {_format_explain(explain['results'][i - 1])}"
+        if result.get("distances"):
+            yield f"- **OKLab distance:** {result['distances'][i - 1]:.4f}"
+        yield ""
+
+
+def _format_explain(hit):
+    """One line: total score = sum of per-term contributions with their BM25 inputs"""
+    terms = " + ".join(f"{t['term']} {t['contribution']:.3f} (tf {t['tf']}, idf {t['idf']:.3f}, norm {t['length_norm']:.3f})"
+                       for t in hit["terms"])
+    return f"score {hit['score']:.3f} (doc length {hit['doc_length']}) = {terms or 'latent match only'}"
+
+
+def _iter_stacks_output(result):
+    """Yield markdown lines for a multi-stack comparison, one section per stack"""
+    if "error" in result:
+        yield f"Error: {result['error']}"
+        return
+
+    yield f"## UI Pro Max Stack Comparison"
+    yield f"**Stacks:** {', '.join(result['stacks'])} | **Query:** {result['query']}"
+    yield f"**Found:** {result['count']} results\n"
+    for stack, rows in result["results"].items():
+        yield f"### {stack} ({len(rows)})"
+        for row in rows:
+            guideline = row.get("Guideline") or next(iter(row.values()), "")
+            details = "; ".join(f"{key}: {value}" for key, value in row.items() if key != "Guideline")
+            if len(details) > MAX_VALUE_CHARS:
+                details = details[:MAX_VALUE_CHARS] + TRUNCATION_MARK
+            yield f"- **{guideline}** — {details}" if details else f"- **{guideline}**"
+        yield ""
+
+
+def _iter_suggest_output(result):
+    """Yield markdown lines for name completions"""
+    if "error" in result:
+        yield f"Error: {result['error']}"
+        return
+
+    yield f"## UI Pro Max Suggestions"
+    yield f"**Prefix:** {result['prefix']} | **Found:** {result['count']} suggestions\n"
+    for item in result["suggestions"]:
+        yield f"- **{item['name']}** ({item['domain']}: {', '.join(item['fields'])})"
 
+
+def _iter_ndjson(result):
+    """Yield one compact JSON object per result row (tagged with its stack when comparing stacks)"""
+    if "error" in result:
+        yield json.dumps({"error": result["error"]}, ensure_ascii=False, separators=(",", ":"))
+        return
+    if "suggestions" in result:
+        for item in result["suggestions"]:
+            yield json.dumps(item, ensure_ascii=False, separators=(",", ":"))
+        return
+    if isinstance(result["results"], dict):
+        for stack, rows in result["results"].items():
+            for row in rows:
+                yield json.dumps({"stack": stack, **row}, ensure_ascii=False, separators=(",", ":"))
+        return
+    explain = result.get("explain")
+    for i, row in enumerate(result["results"]):
+        if explain and "results" in explain:
+            row = {**row, "_explain": explain["results"][i]}
+        yield json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+
+
+def _render(lines, max_chars=None, whole_lines=False):
+    """Join lines, stopping once max_chars is reached (the last line is cut unless whole_lines)"""
+    output = []
+    used = 0
+    for line in lines:
+        cost = len(line) + (1 if output else 0)
+        if max_chars is not None and used + cost > max_chars:
+            room = max_chars - used - (1 if output else 0) - len(TRUNCATION_MARK)
+            if not whole_lines and room > 0:
+                output.append(line[:room] + TRUNCATION_MARK)
+            break
+        output.append(line)
+        used += cost
     return "\n".join(output)
 
 
+def format_output(result, max_chars=None):
+    """Format results for Claude consumption (token-optimized), within an optional character budget"""
+    if "stacks" in result:
+        return _render(_iter_stacks_output(result), max_chars)
+    if "suggestions" in result:
+        return _render(_iter_suggest_output(result), max_chars)
+    return _render(_iter_output(result), max_chars)
+
+
+def format_ndjson(result, max_chars=None):
+    """Format results as compact NDJSON; rows that don't fit the budget are dropped whole"""
+    return _render(_iter_ndjson(result), max_chars, whole_lines=True)
+
+
+def _parse_filters(specs):
+    """["Col=A,B", ...] -> {"Col": ["A", "B"]}; returns None for no filters, raises ValueError on a bad spec"""
+    filters = {}
+    for spec in specs or []:
+        column, sep, values = spec.partition("=")
+        values = [v.strip() for v in values.split(",") if v.strip()]
+        if not sep or not column.strip() or not values:
+            raise ValueError(f"Bad filter {spec!r}; expected Column=Value[,Value]")
+        filters.setdefault(column.strip(), []).extend(values)
+    return filters or None
+
+
+def _print_result(result, args):
+    if args.ndjson:
+        print(format_ndjson(result, args.max_chars))
+    elif args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(format_output(result, args.max_chars))
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="UI Pro Max Search")
     parser.add_argument("query", help="Search query")
     parser.add_argument("--domain", "-d", choices=list(CSV_CONFIG.keys()), help="Search domain")
-    parser.add_argument("--stack", "-s", choices=AVAILABLE_STACKS, help="Stack-specific search (html-tailwind, react, nextjs)")
+    parser.add_argument("--stack", "-s", help="Stack-specific search (html-tailwind, react, nextjs); comma list or \"all\" to compare stacks")
     parser.add_argument("--max-results", "-n", type=int, default=MAX_RESULTS, help="Max results (default: 3)")
+    parser.add_argument("--route", choices=["keyword", "index"], default="keyword", help="Domain auto-detection when --domain is omitted (default: keyword)")
+    parser.add_argument("--fuzzy", action="store_true", help="Tolerate typos by expanding unknown words to the nearest indexed terms")
+    parser.add_argument("--hybrid", action="store_true", help="Fuse BM25 with local latent semantic (LSA) matches; needs NumPy")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
+    parser.add_argument("--explain", action="store_true", help="Show per-term tf, idf, length norm and contribution for each hit")
+    parser.add_argument("--suggest", action="store_true", help="Complete the query as an icon, font or style name prefix")
+    parser.add_argument("--filter", action="append", metavar="COL=VAL[,VAL]",
+                        help="Only score rows whose categorical column matches (Severity, Platform, Category, Library, Type, Complexity); repeatable")
+    # Compact output (token budget)
+    parser.add_argument("--fields", type=str, default=None, help="Comma-separated output columns to return (e.g. \"Style Category,Keywords\")")
+    parser.add_argument("--ndjson", action="store_true", help="Output one compact JSON object per result")
+    parser.add_argument("--max-chars", type=int, default=None, help="Stop rendering once the output reaches this many characters")
     # Design system generation
     parser.add_argument("--design-system", "-ds", action="store_true", help="Generate complete design system recommendation")
     parser.add_argument("--project-name", "-p", type=str, default=None, help="Project name for design system output")
     parser.add_argument("--format", "-f", choices=["ascii", "markdown"], default="ascii", help="Output format for design system")
+    parser.add_argument("--no-cache", action="store_true", help="Regenerate the design system instead of using the on-disk cache")
     # Persistence (Master + Overrides pattern)
     parser.add_argument("--persist", action="store_true", help="Save design system to design-system/MASTER.md (creates hierarchical structure)")
     parser.add_argument("--page", type=str, default=None, help="Create page-specific override file in design-system/pages/")
+    parser.add_argument("--pages", type=str, default=None, help="Comma-separated pages (e.g. home,pricing,dashboard); all override files in one run")
     parser.add_argument("--output-dir", "-o", type=str, default=None, help="Output directory for persisted files (default: current directory)")
 
     args = parser.parse_args()
+    pages = list(dict.fromkeys(p.strip() for p in args.pages.split(",") if p.strip())) if args.pages else []
+    fields = [f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else None
+    try:
+        filters = _parse_filters(args.filter)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json and args.max_chars is not None:
+        parser.error("--max-chars limits text and --ndjson output; it can't be combined with --json")
 
     # Design system takes priority
     if args.design_system:
-        result = generate_design_system(
+        generate_design_system(
             args.query, 
             args.project_name, 
             args.format,
             persist=args.persist,
             page=args.page,
-            output_dir=args.output_dir
+            output_dir=args.output_dir,
+            use_cache=not args.no_cache,
+            pages=pages,
+            stream=sys.stdout
         )
-        print(result)
+        print()
         
         # Print persistence confirmation
         if args.persist:
@@ -89,26 +265,30 @@ if __name__ == "__main__":
             print("\n" + "=" * 60)
             print(f"✅ Design system persisted to design-system/{project_slug}/")
             print(f"   📄 design-system/{project_slug}/MASTER.md (Global Source of Truth)")
-            if args.page:
-                page_filename = args.page.lower().replace(' ', '-')
+            page_filenames = ([args.page] if args.page else []) + pages
+            for page_filename in dict.fromkeys(p.lower().replace(' ', '-') for p in page_filenames):
                 print(f"   📄 design-system/{project_slug}/pages/{page_filename}.md (Page Overrides)")
             print("")
             print(f"📖 Usage: When building a page, check design-system/{project_slug}/pages/[page].md first.")
             print(f"   If exists, its rules override MASTER.md. Otherwise, use MASTER.md.")
             print("=" * 60)
+    # Name completion
+    elif args.suggest:
+        _print_result(suggest(args.query, args.domain, args.max_results), args)
     # Stack search
     elif args.stack:
-        result = search_stack(args.query, args.stack, args.max_results)
-        if args.json:
-            import json
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+        stacks = [s.strip() for s in args.stack.split(",") if s.strip()]
+        if not stacks:
+            parser.error(f"No stack given in --stack {args.stack!r}")
+        if stacks == ["all"] or len(stacks) > 1:
+            result = search_stacks(args.query, "all" if stacks == ["all"] else stacks, args.max_results,
+                                   fuzzy=args.fuzzy, hybrid=args.hybrid, fields=fields, filters=filters)
         else:
-            print(format_output(result))
+            result = search_stack(args.query, stacks[0], args.max_results, fuzzy=args.fuzzy, hybrid=args.hybrid,
+                                  fields=fields, explain=args.explain, filters=filters)
+        _print_result(result, args)
     # Domain search
     else:
-        result = search(args.query, args.domain, args.max_results)
-        if args.json:
-            import json
-            print(json.dumps(result, indent=2, ensure_ascii=False))
-        else:
-            print(format_output(result))
+        result = search(args.query, args.domain, args.max_results, route=args.route, fuzzy=args.fuzzy, hybrid=args.hybrid,
+                        fields=fields, explain=args.explain, filters=filters)
+        _print_result(result, args)